@@ -0,0 +1,401 @@
+"""Bulk export/import — GET /api/export/{dataset}, POST /api/import/{dataset}.
+
+Exports stream straight from a database cursor in pages of PAGE_SIZE rows, so
+memory stays flat regardless of inventory size. Formats:
+
+- ``ndjson``: one JSON object per line
+- ``csv``: header row, tags as a JSON array string
+- ``arrow``: Arrow IPC stream, one record batch per page (needs ``pyarrow``)
+
+Imports accept ndjson or csv for ``devices`` (upserted on ip) and ``ports``
+(upserted on device_ip, port, protocol). The body is spooled to a temp file,
+validated in full, then inserted in batches inside one transaction, so a bad
+row anywhere in the file imports nothing.
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import tempfile
+from contextlib import closing
+from datetime import datetime
+from typing import Iterator
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from ..db.coverage import port_last_seen
+from ..db.models import Device, DeviceScanRecord, DeviceTag, Port, ScanHistory
+
+router = APIRouter(prefix="/api", tags=["bulk"])
+
+PAGE_SIZE = 1000
+BATCH_SIZE = 500
+
+_tags_json = (
+    select(func.json_group_array(DeviceTag.tag))
+    .where(DeviceTag.device_id == Device.id)
+    .scalar_subquery()
+)
+
+# dataset → list of (name, column expression, kind); kind is int|str|bool|datetime|list
+_DATASETS = {
+    "devices": [
+        ("id", Device.id, "int"),
+        ("ip", Device.ip, "str"),
+        ("mac", Device.mac, "str"),
+        ("hostname", Device.hostname, "str"),
+        ("vendor", Device.vendor, "str"),
+        ("os", Device.os, "str"),
+        ("nickname", Device.nickname, "str"),
+        ("icon_type", Device.icon_type, "str"),
+        ("tags", _tags_json, "list"),
+        ("first_seen", Device.first_seen, "datetime"),
+        ("last_seen", Device.last_seen, "datetime"),
+        ("is_online", Device.is_online, "bool"),
+        ("sweep_scanned_at", Device.sweep_scanned_at, "datetime"),
+        ("sweep_coverage", Device.sweep_coverage, "str"),
+        ("deep_scanned_at", Device.deep_scanned_at, "datetime"),
+        ("deep_coverage", Device.deep_coverage, "str"),
+    ],
+    "ports": [
+        ("id", Port.id, "int"),
+        ("device_id", Port.device_id, "int"),
+        ("device_ip", Device.ip, "str"),
+        ("port", Port.port, "int"),
+        ("protocol", Port.protocol, "str"),
+        ("service", Port.service, "str"),
+        ("version", Port.version, "str"),
+        ("state", Port.state, "str"),
+        ("first_seen", Port.first_seen, "datetime"),
+        ("last_seen", Port.last_seen, "datetime"),
+        ("closed_at", Port.closed_at, "datetime"),
+    ],
+    "scans": [
+        ("id", ScanHistory.id, "int"),
+        ("kind", ScanHistory.kind, "str"),
+        ("status", ScanHistory.status, "str"),
+        ("started_at", ScanHistory.started_at, "datetime"),
+        ("finished_at", ScanHistory.finished_at, "datetime"),
+        ("devices_found", ScanHistory.devices_found, "int"),
+        ("error_msg", ScanHistory.error_msg, "str"),
+    ],
+    "presence": [
+        ("id", DeviceScanRecord.id, "int"),
+        ("device_id", DeviceScanRecord.device_id, "int"),
+        ("scan_id", DeviceScanRecord.scan_id, "int"),
+        ("scanned_at", DeviceScanRecord.scanned_at, "datetime"),
+        ("is_online", DeviceScanRecord.is_online, "bool"),
+    ],
+}
+
+_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def _dataset(name: str) -> list[tuple]:
+    cols = _DATASETS.get(name)
+    if cols is None:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset '{name}'")
+    return cols
+
+
+# Device scan coverage selected after the port columns to report last_seen
+# the way the API does (unchanged open ports aren't rewritten by scans)
+_PORT_SCAN_COLS = (
+    Device.sweep_scanned_at, Device.sweep_coverage,
+    Device.deep_scanned_at, Device.deep_coverage,
+)
+
+
+def _query(name: str):
+    cols = _dataset(name)
+    stmt = select(*(expr.label(col) for col, expr, _ in cols))
+    if name == "ports":
+        stmt = stmt.add_columns(*_PORT_SCAN_COLS).join(Device, Device.id == Port.device_id)
+    return stmt.order_by(cols[0][1])
+
+
+def _port_row(row) -> tuple:
+    n = len(_DATASETS["ports"])
+    values, (sweep_at, sweep_cov, deep_at, deep_cov) = list(row[:n]), row[n:]
+    names = [col for col, _, _ in _DATASETS["ports"]]
+    get = dict(zip(names, values)).get
+    values[names.index("last_seen")] = port_last_seen(
+        get("last_seen"), get("closed_at"), get("port"), get("protocol"),
+        ((sweep_at, sweep_cov), (deep_at, deep_cov)),
+    )
+    return tuple(values)
+
+
+def _pages(name: str) -> Iterator[list]:
+    """Yield pages of result rows from a streaming cursor on its own session."""
+    from ..db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        result = db.execute(_query(name).execution_options(yield_per=PAGE_SIZE))
+        for page in result.partitions():
+            yield [_port_row(r) for r in page] if name == "ports" else page
+    finally:
+        db.close()
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() + "Z" if value else None
+
+
+def _ndjson(name: str) -> Iterator[bytes]:
+    cols = _dataset(name)
+    for page in _pages(name):
+        lines = []
+        for row in page:
+            obj = {}
+            for (col, _, kind), value in zip(cols, row):
+                if kind == "datetime":
+                    value = _iso(value)
+                elif kind == "list":
+                    value = json.loads(value) if value else []
+                obj[col] = value
+            lines.append(json.dumps(obj))
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def _csv(name: str) -> Iterator[bytes]:
+    cols = _dataset(name)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([col for col, _, _ in cols])
+    for page in _pages(name):
+        for row in page:
+            writer.writerow([
+                _iso(v) if kind == "datetime" else ("" if v is None else v)
+                for (_, _, kind), v in zip(cols, row)
+            ])
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def _arrow(name: str) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    cols = _dataset(name)
+    types = {
+        "int": pa.int64(),
+        "str": pa.string(),
+        "bool": pa.bool_(),
+        "datetime": pa.timestamp("us"),
+        "list": pa.list_(pa.string()),
+    }
+    schema = pa.schema([(col, types[kind]) for col, _, kind in cols])
+    # Each page is written as one record batch into a buffer that is emptied
+    # after every yield.
+    out = io.BytesIO()
+    writer = pa.ipc.new_stream(out, schema)
+    for page in _pages(name):
+        arrays = []
+        for i, (_, _, kind) in enumerate(cols):
+            values = [row[i] for row in page]
+            if kind == "list":
+                values = [json.loads(v) if v else [] for v in values]
+            arrays.append(pa.array(values, type=types[kind]))
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    writer.close()
+    yield out.getvalue()
+
+
+@router.get("/export/{dataset}")
+def export_dataset(dataset: str, format: str = "ndjson") -> StreamingResponse:
+    _dataset(dataset)
+    if format == "ndjson":
+        body = _ndjson(dataset)
+    elif format == "csv":
+        body = _csv(dataset)
+    elif format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Arrow export requires pyarrow")
+        body = _arrow(dataset)
+    else:
+        raise HTTPException(status_code=400, detail="format must be ndjson, csv or arrow")
+
+    ext = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        body,
+        media_type=_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{ext}"'},
+    )
+
+
+# ── Import ────────────────────────────────────────────────────────────────────
+
+def _coerce(value, kind: str):
+    if value is None or value == "":
+        return [] if kind == "list" else None
+    if kind == "int":
+        return int(value)
+    if kind == "bool":
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes")
+        return bool(value)
+    if kind == "datetime":
+        return datetime.fromisoformat(str(value).rstrip("Z"))
+    if kind == "list":
+        items = json.loads(value) if isinstance(value, str) else value
+        if not isinstance(items, list) or not all(isinstance(i, str) for i in items):
+            raise ValueError(f"expected a list of strings, got {value!r}")
+        return items
+    return str(value)
+
+
+def _read_records(f, format: str) -> Iterator[dict]:
+    f.seek(0)
+    # newline="" so quoted CSV fields keep their embedded line breaks
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+    try:
+        if format == "csv":
+            yield from csv.DictReader(text)
+        else:
+            for line in text:
+                if line.strip():
+                    rec = json.loads(line)
+                    if not isinstance(rec, dict):
+                        raise ValueError(f"expected a JSON object per line, got {line.strip()[:80]!r}")
+                    yield rec
+    finally:
+        text.detach()  # leave f open for the next pass
+
+
+def _batches(records: Iterator[dict], kinds: dict[str, str]) -> Iterator[list[dict]]:
+    batch: list[dict] = []
+    for rec in records:
+        batch.append({k: _coerce(rec.get(k), kind) for k, kind in kinds.items() if k in rec})
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _import_devices(db, batches: Iterator[list[dict]]) -> int:
+    fields = ("mac", "hostname", "vendor", "os", "nickname", "icon_type",
+              "first_seen", "last_seen", "is_online",
+              "sweep_scanned_at", "sweep_coverage", "deep_scanned_at", "deep_coverage")
+    count = 0
+    for batch in batches:
+        rows = []
+        tags: dict[str, list[str]] = {}
+        for rec in batch:
+            if not rec.get("ip"):
+                continue
+            rows.append({"ip": rec["ip"], **{f: rec[f] for f in fields if f in rec}})
+            if rec.get("tags"):
+                tags[rec["ip"]] = rec["tags"]
+        if not rows:
+            continue
+        # Rows in one executemany must share keys; group by the columns present
+        by_keys: dict[tuple, list[dict]] = {}
+        for row in rows:
+            by_keys.setdefault(tuple(sorted(row)), []).append(row)
+        for keys, group in by_keys.items():
+            stmt = insert(Device)
+            update_cols = {k: stmt.excluded[k] for k in keys if k != "ip"}
+            stmt = (
+                stmt.on_conflict_do_update(index_elements=["ip"], set_=update_cols)
+                if update_cols else stmt.on_conflict_do_nothing(index_elements=["ip"])
+            )
+            db.execute(stmt, group)
+        if tags:
+            ids = dict(db.execute(select(Device.ip, Device.id).where(Device.ip.in_(list(tags)))).all())
+            tag_rows = [{"device_id": ids[ip], "tag": t} for ip, ts in tags.items() for t in ts if ip in ids]
+            if tag_rows:
+                db.execute(insert(DeviceTag).on_conflict_do_nothing(), tag_rows)
+        count += len(rows)
+    return count
+
+
+def _import_ports(db, batches: Iterator[list[dict]]) -> int:
+    fields = ("service", "version", "state", "first_seen", "last_seen", "closed_at")
+    count = 0
+    for batch in batches:
+        ips = {rec["device_ip"] for rec in batch if rec.get("device_ip")}
+        ids = dict(db.execute(select(Device.ip, Device.id).where(Device.ip.in_(list(ips)))).all())
+        by_keys: dict[tuple, list[dict]] = {}
+        for rec in batch:
+            device_id = ids.get(rec.get("device_ip"))
+            if device_id is None or rec.get("port") is None:
+                continue
+            row = {
+                "device_id": device_id,
+                "port": rec["port"],
+                "protocol": rec.get("protocol") or "tcp",
+                **{f: rec[f] for f in fields if f in rec},
+            }
+            by_keys.setdefault(tuple(sorted(row)), []).append(row)
+        for keys, group in by_keys.items():
+            stmt = insert(Port)
+            update_cols = {k: stmt.excluded[k] for k in keys if k in fields}
+            stmt = (
+                stmt.on_conflict_do_update(
+                    index_elements=["device_id", "port", "protocol"], set_=update_cols)
+                if update_cols else stmt.on_conflict_do_nothing(
+                    index_elements=["device_id", "port", "protocol"])
+            )
+            db.execute(stmt, group)
+            count += len(group)
+    return count
+
+
+_IMPORTERS = {"devices": _import_devices, "ports": _import_ports}
+
+
+def _run_import(dataset: str, format: str, f) -> int:
+    from ..db.database import SessionLocal
+    from ..db.search import rebuild_search_index
+
+    kinds = {col: kind for col, _, kind in _DATASETS[dataset]}
+    # First pass only parses, so a bad row late in the file fails before any write
+    with closing(_read_records(f, format)) as records:
+        for _ in _batches(records, kinds):
+            pass
+    db = SessionLocal()
+    try:
+        with closing(_read_records(f, format)) as records:
+            count = _IMPORTERS[dataset](db, _batches(records, kinds))
+        rebuild_search_index(db)
+        db.commit()
+    finally:
+        db.close()
+    return count
+
+
+@router.post("/import/{dataset}")
+async def import_dataset(dataset: str, request: Request, format: str = "ndjson") -> dict:
+    if dataset not in _IMPORTERS:
+        raise HTTPException(status_code=400, detail="Only devices and ports can be imported")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+    with tempfile.TemporaryFile() as f:
+        async for chunk in request.stream():
+            f.write(chunk)
+        loop = asyncio.get_running_loop()
+        try:
+            count = await loop.run_in_executor(None, _run_import, dataset, format, f)
+        except (ValueError, KeyError) as exc:
+            raise HTTPException(status_code=400, detail=f"Bad {format} input: {exc}")
+    return {"dataset": dataset, "imported": count}
@@ -1,15 +1,17 @@
 """Device REST endpoints."""
 from __future__ import annotations
 
-import json
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
 
+from ..db.coverage import device_scans, port_last_seen
 from ..db.database import get_db
-from ..db.models import Device, DeviceScanRecord, Port
+from ..db.models import Device, DeviceScanRecord, DeviceTag, Port, PortEvent
+from ..db.search import index_device, matching_ids
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
 
@@ -38,24 +40,29 @@ class DevicePatch(BaseModel):
     icon_type: str | None = None
 
 
+def _port_to_dict(p: Port, device: Device) -> dict:
+    # Unchanged open ports aren't rewritten by scans; the latest scan that
+    # covered the port is its last sighting
+    last_seen = port_last_seen(p.last_seen, p.closed_at, p.port, p.protocol, device_scans(device))
+    return {
+        "id": p.id,
+        "port": p.port,
+        "protocol": p.protocol,
+        "service": p.service,
+        "version": (p.version or "").strip() or None,
+        "state": p.state,
+        "first_seen": p.first_seen.isoformat() + "Z" if p.first_seen else None,
+        "last_seen": last_seen.isoformat() + "Z" if last_seen else None,
+        "closed_at": p.closed_at.isoformat() + "Z" if p.closed_at else None,
+    }
+
+
 def _device_to_dict(device: Device) -> dict:
-    tags = []
-    if device.tags:
-        try:
-            tags = json.loads(device.tags)
-        except Exception:
-            tags = []
+    tags = [t.tag for t in device.tag_rows]
     ports = [
-        {
-            "id": p.id,
-            "port": p.port,
-            "protocol": p.protocol,
-            "service": p.service,
-            "version": (p.version or "").strip() or None,
-            "state": p.state,
-            "last_seen": p.last_seen.isoformat() + "Z" if p.last_seen else None,
-        }
+        _port_to_dict(p, device)
         for p in sorted(device.ports, key=lambda x: x.port)
+        if p.closed_at is None
     ]
     return {
         "id": device.id,
@@ -76,10 +83,86 @@ def _device_to_dict(device: Device) -> dict:
 
 @router.get("")
 def list_devices(db: Session = Depends(get_db)) -> list[dict]:
-    devices = db.query(Device).order_by(Device.ip).all()
+    devices = (
+        db.query(Device)
+        .options(selectinload(Device.ports), selectinload(Device.tag_rows))
+        .order_by(Device.ip)
+        .all()
+    )
     return [_device_to_dict(d) for d in devices]
 
 
+@router.get("/search")
+def search_devices(
+    q: str | None = None,
+    icon_type: list[str] = Query(default=[]),
+    vendor: list[str] = Query(default=[]),
+    port: list[int] = Query(default=[]),
+    tag: list[str] = Query(default=[]),
+    online: bool | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db),
+) -> dict:
+    """Free-text search plus facet filters; facet counts cover the whole match."""
+    ids = select(Device.id)
+    if q:
+        fts_ids = matching_ids(q)
+        if fts_ids is not None:
+            ids = ids.where(Device.id.in_(fts_ids))
+    if icon_type:
+        ids = ids.where(Device.icon_type.in_(icon_type))
+    if vendor:
+        ids = ids.where(Device.vendor.in_(vendor))
+    if online is not None:
+        ids = ids.where(Device.is_online == online)
+    if port:
+        ids = ids.where(Device.id.in_(
+            select(Port.device_id).where(Port.port.in_(port), Port.closed_at.is_(None))
+        ))
+    if tag:
+        ids = ids.where(Device.id.in_(
+            select(DeviceTag.device_id).where(DeviceTag.tag.in_(tag))
+        ))
+
+    total = db.scalar(select(func.count()).select_from(ids.subquery()))
+    devices = (
+        db.query(Device)
+        .options(selectinload(Device.ports), selectinload(Device.tag_rows))
+        .filter(Device.id.in_(ids))
+        .order_by(Device.ip)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+
+    def facet(col, *where, count=func.count(), top: int | None = None) -> dict:
+        stmt = select(col, count).where(*where).group_by(col).order_by(count.desc())
+        if top:
+            stmt = stmt.limit(top)
+        return {k if k is not None else "": n for k, n in db.execute(stmt)}
+
+    in_match = Device.id.in_(ids)
+    facets = {
+        "icon_type": facet(func.coalesce(Device.icon_type, "device"), in_match),
+        "vendor": facet(Device.vendor, in_match, top=25),
+        "online": {
+            ("true" if k else "false"): n
+            for k, n in facet(Device.is_online, in_match).items()
+        },
+        "port": facet(
+            Port.port, Port.device_id.in_(ids), Port.closed_at.is_(None),
+            count=func.count(func.distinct(Port.device_id)), top=25,
+        ),
+        "tag": facet(DeviceTag.tag, DeviceTag.device_id.in_(ids), top=25),
+    }
+    return {
+        "total": total,
+        "results": [_device_to_dict(d) for d in devices],
+        "facets": facets,
+    }
+
+
 @router.get("/{device_id}")
 def get_device(device_id: int, db: Session = Depends(get_db)) -> dict:
     device = db.query(Device).filter(Device.id == device_id).first()
@@ -112,6 +195,40 @@ def get_device_history(device_id: int, db: Session = Depends(get_db)) -> list[di
     return [_record_to_dict(r) for r in records]
 
 
+def _port_event_to_dict(e: PortEvent) -> dict:
+    return {
+        "id": e.id,
+        "scan_id": e.scan_id,
+        "event": e.event,
+        "service": e.service,
+        "version": e.version,
+        "at": e.at.isoformat() + "Z" if e.at else None,
+    }
+
+
+@router.get("/{device_id}/ports")
+def get_device_ports(device_id: int, db: Session = Depends(get_db)) -> list[dict]:
+    """Every port ever seen on the device, including closed ones, with events."""
+    device = db.query(Device).filter(Device.id == device_id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return [
+        {**_port_to_dict(p, device), "events": [_port_event_to_dict(e) for e in p.events[:50]]}
+        for p in sorted(device.ports, key=lambda x: (x.port, x.protocol))
+    ]
+
+
+def _set_tags(device: Device, tags: list[str]) -> None:
+    wanted = list(dict.fromkeys(t.strip() for t in tags if t and t.strip()))
+    for row in list(device.tag_rows):
+        if row.tag not in wanted:
+            device.tag_rows.remove(row)
+    have = {row.tag for row in device.tag_rows}
+    for tag in wanted:
+        if tag not in have:
+            device.tag_rows.append(DeviceTag(tag=tag))
+
+
 @router.patch("/{device_id}")
 def patch_device(
     device_id: int, patch: DevicePatch, db: Session = Depends(get_db)
@@ -123,10 +240,12 @@ def patch_device(
     if patch.nickname is not None:
         device.nickname = patch.nickname
     if patch.tags is not None:
-        device.tags = json.dumps(patch.tags)
+        _set_tags(device, patch.tags)
     if patch.icon_type is not None:
         device.icon_type = patch.icon_type
 
+    db.flush()
+    index_device(db, device)
     db.commit()
     db.refresh(device)
     return _device_to_dict(device)
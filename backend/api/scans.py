@@ -2,18 +2,31 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Any
 
 from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
+from ..db import shared
+from ..db.coverage import device_scans, port_last_seen, record_scan
 from ..db.database import get_db
-from ..db.models import Device, DeviceScanRecord, Port, ScanHistory
+from ..db.models import Device, DeviceScanRecord, Port, PortEvent, ScanHistory
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/scan", tags=["scan"])
 
-# Shared scan state (single-process model is fine for a local tool)
+SCAN_HEARTBEAT_SECONDS = 30
+LOCK_LOST = "Scan lock lost to another worker"
+
+# Progress of the scan running in this worker. Every broadcast also persists
+# it to the shared scan_state row, which is what get_scan_state() reads, so
+# any worker can report on a scan running in another.
 _scan_state: dict[str, Any] = {
     "status": "idle",  # idle | running | done | error
     "phase": None,
@@ -24,33 +37,144 @@ _scan_state: dict[str, Any] = {
     "error": None,
 }
 
-# WebSocket broadcast function — injected at startup by main.py
-_broadcast_fn = None
 
+def get_scan_state() -> dict:
+    return shared.load_scan_state() or dict(_scan_state)
 
-def set_broadcast(fn) -> None:
-    global _broadcast_fn
-    _broadcast_fn = fn
 
+def try_begin_scan() -> bool:
+    """Take the cross-worker scan lock. run_scan/run_deep_scan release it."""
+    return shared.try_acquire_scan()
 
-def get_scan_state() -> dict:
-    return dict(_scan_state)
+
+# One thread keeps progress writes off the event loop and in order
+_publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-publish")
+# The lock heartbeat gets its own thread so long nmap or DNS calls filling the
+# default pool can never delay it past SCAN_STALE_AFTER
+_heartbeater = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-heartbeat")
+
+
+def _publish(state: dict, msg: dict) -> None:
+    shared.save_scan_state(state)
+    shared.publish(msg)
 
 
 async def _broadcast(msg: dict) -> None:
-    if _broadcast_fn:
-        await _broadcast_fn(msg)
+    # Relayed to WebSocket clients of every worker by main.py. Progress is
+    # best-effort: a busy database must not fail the scan itself.
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_publisher, _publish, dict(_scan_state), msg)
+    except Exception:
+        logger.warning("could not publish scan progress", exc_info=True)
+
+
+async def _heartbeat(scan_task: asyncio.Task) -> bool:
+    """Keep the scan lock alive while ``scan_task`` runs.
+
+    A busy database only skips a beat (the lock survives SCAN_STALE_AFTER).
+    If the lock was lost anyway, the scan is cancelled and True is returned.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SCAN_HEARTBEAT_SECONDS)
+        try:
+            owned = await loop.run_in_executor(_heartbeater, shared.heartbeat_scan)
+        except OperationalError:
+            logger.warning("scan heartbeat failed, retrying", exc_info=True)
+            continue
+        if not owned:
+            scan_task.cancel()
+            return True
+
+
+def _lock_lost(heartbeat: asyncio.Task) -> bool:
+    return heartbeat.done() and not heartbeat.cancelled() and heartbeat.result()
+
+
+def _sync_ports(db: Session, device: Device, result, scan_id: int, kind: str) -> None:
+    """Diff a port scan against the device's stored ports and apply only changes.
+
+    Rows are keyed on (port, protocol). Ports that are still open with the same
+    service/version are left untouched; new, changed, reopened and vanished
+    ports are updated in place and get a PortEvent. Only ports inside the
+    range nmap actually probed can be closed, so the regular sweep leaves
+    ports found by a deep scan alone. The probed ranges are recorded on the
+    device per scan ``kind``, which is where an unchanged open port's
+    last_seen comes from (db/coverage.py).
+    """
+    now = datetime.utcnow()
+    existing = {(p.port, p.protocol): p for p in device.ports}
+    seen: set[tuple[int, str]] = set()
+
+    for p in result.ports:
+        if p.state != "open":
+            continue
+        key = (p.port, p.protocol)
+        if key in seen:
+            continue
+        seen.add(key)
+        version = (p.version or "").strip() or None
+        row = existing.get(key)
+
+        if row is None:
+            row = Port(
+                device_id=device.id,
+                port=p.port,
+                protocol=p.protocol,
+                service=p.service,
+                version=version,
+                state="open",
+                first_seen=now,
+                last_seen=now,
+            )
+            device.ports.append(row)
+            event = "opened"
+        elif row.closed_at is not None:
+            row.state = "open"
+            row.closed_at = None
+            row.service = p.service
+            row.version = version
+            row.last_seen = now
+            event = "opened"
+        elif row.service != p.service or row.version != version:
+            row.service = p.service
+            row.version = version
+            row.last_seen = now
+            event = "changed"
+        else:
+            continue
+
+        row.events.append(PortEvent(scan_id=scan_id, event=event,
+                                    service=row.service, version=row.version, at=now))
+
+    for key, row in existing.items():
+        if key in seen or row.closed_at is not None or not result.covers(*key):
+            continue
+        # Last open sighting is the previous scan that covered this port
+        row.last_seen = port_last_seen(row.last_seen, None, *key, device_scans(device))
+        row.state = "closed"
+        row.closed_at = now
+        row.events.append(PortEvent(scan_id=scan_id, event="closed",
+                                    service=row.service, version=row.version, at=now))
+
+    record_scan(device, kind, result.scanned, now)
 
 
 async def run_scan(subnet: str | None = None) -> None:
-    """Full scan pipeline: discover → vendor → port scan."""
+    """Full scan pipeline: discover → vendor → port scan.
+
+    The caller must hold the scan lock (try_begin_scan); it is released here.
+    """
     from ..scanner.discover import discover_hosts
+    from ..scanner.names import resolve_names
     from ..scanner.ports import scan_device, _infer_icon
     from ..scanner.vendor import get_vendor
     from ..db.database import SessionLocal
+    from ..db.search import index_device
 
     db = SessionLocal()
-    scan = ScanHistory(started_at=datetime.utcnow(), status="running")
+    scan = ScanHistory(started_at=datetime.utcnow(), status="running", kind="sweep")
     db.add(scan)
     db.commit()
     db.refresh(scan)
@@ -58,6 +182,7 @@ async def run_scan(subnet: str | None = None) -> None:
     _scan_state["status"] = "running"
     _scan_state["scan_id"] = scan.id
     _scan_state["error"] = None
+    heartbeat = asyncio.create_task(_heartbeat(asyncio.current_task()))
 
     try:
         # Phase 1: Discovery
@@ -68,14 +193,15 @@ async def run_scan(subnet: str | None = None) -> None:
 
         loop = asyncio.get_running_loop()
 
-        def discover_progress(phase, current, total, device_ip):
+        def report_progress(phase, current, total, device_ip):
+            # Safe to call from the executor threads as well as the loop
             _scan_state["phase"] = phase
             _scan_state["current"] = current
             _scan_state["total"] = total
             _scan_state["device"] = device_ip
             asyncio.run_coroutine_threadsafe(_broadcast(dict(_scan_state)), loop)
 
-        hosts = await discover_hosts(subnet=subnet, progress_cb=discover_progress)
+        hosts = await discover_hosts(subnet=subnet, progress_cb=report_progress)
 
         # Mark all devices offline first
         db.query(Device).update({"is_online": False})
@@ -83,6 +209,19 @@ async def run_scan(subnet: str | None = None) -> None:
 
         total_hosts = len(hosts)
 
+        # Phase 1b: Name resolution for hosts the sweep couldn't name
+        unnamed = [h for h in hosts if not h.hostname]
+        if unnamed:
+            _scan_state["phase"] = "names"
+            _scan_state["current"] = 0
+            _scan_state["total"] = len(unnamed)
+            await _broadcast({**_scan_state, "message": f"Resolving names for {len(unnamed)} hosts..."})
+            names = await resolve_names(
+                db, [(h.ip, h.mac) for h in unnamed], progress_cb=report_progress
+            )
+            for h in unnamed:
+                h.hostname = names.get(h.ip)
+
         # Phase 2: Vendor + device upsert
         _scan_state["phase"] = "vendor"
         _scan_state["total"] = total_hosts
@@ -112,6 +251,9 @@ async def run_scan(subnet: str | None = None) -> None:
                     last_seen=datetime.utcnow(),
                 )
                 db.add(device)
+            # Hostname/vendor are searchable; index them in the same commit
+            db.flush()
+            index_device(db, device)
             db.commit()
 
         # Phase 3: Port scanning
@@ -134,24 +276,12 @@ async def run_scan(subnet: str | None = None) -> None:
             if result.os:
                 device.os = result.os
 
-            # Update ports: delete old, insert fresh
-            db.query(Port).filter(Port.device_id == device.id).delete()
-            for p in result.ports:
-                if p.state == "open":
-                    db.add(
-                        Port(
-                            device_id=device.id,
-                            port=p.port,
-                            protocol=p.protocol,
-                            service=p.service,
-                            version=p.version,
-                            state=p.state,
-                            last_seen=datetime.utcnow(),
-                        )
-                    )
+            _sync_ports(db, device, result, scan.id)
 
             # Infer icon type
             device.icon_type = _infer_icon(device.vendor, device.hostname, result.ports)
+            db.flush()
+            index_device(db, device)
             db.commit()
 
         # Write presence record for every known device
@@ -178,28 +308,139 @@ async def run_scan(subnet: str | None = None) -> None:
         _scan_state["total"] = total_hosts
         await _broadcast({**_scan_state, "message": f"Scan complete. {devices_found} devices online."})
 
-    except Exception as exc:
+    except (Exception, asyncio.CancelledError) as exc:
+        lost = _lock_lost(heartbeat)
+        error = LOCK_LOST if lost else str(exc) or type(exc).__name__
         _scan_state["status"] = "error"
-        _scan_state["error"] = str(exc)
+        _scan_state["error"] = error
         scan.status = "error"
-        scan.error_msg = str(exc)
+        scan.error_msg = error
         scan.finished_at = datetime.utcnow()
         db.commit()
-        await _broadcast({**_scan_state, "message": f"Scan error: {exc}"})
+        if not lost:  # the progress row now belongs to the other worker's scan
+            await _broadcast({**_scan_state, "message": f"Scan error: {error}"})
         raise
     finally:
+        heartbeat.cancel()
+        shared.release_scan()
+        db.close()
+
+
+async def run_deep_scan(udp: bool = True, pps_budget: int | None = None) -> None:
+    """Deep scan of every online device: full TCP range plus UDP services.
+
+    The caller must hold the scan lock (try_begin_scan); it is released here.
+    """
+    from ..scanner.ports import DEFAULT_PPS_BUDGET, deep_scan_device, deep_workers, _infer_icon
+    from ..db.database import SessionLocal
+    from ..db.search import index_device
+
+    db = SessionLocal()
+    scan = ScanHistory(started_at=datetime.utcnow(), status="running", kind="deep")
+    db.add(scan)
+    db.commit()
+    db.refresh(scan)
+
+    _scan_state["status"] = "running"
+    _scan_state["scan_id"] = scan.id
+    _scan_state["error"] = None
+    heartbeat = asyncio.create_task(_heartbeat(asyncio.current_task()))
+
+    try:
+        targets = [ip for (ip,) in db.query(Device.ip).filter(Device.is_online == True).all()]
+        total = len(targets)
+        _scan_state["phase"] = "deepscan"
+        _scan_state["current"] = 0
+        _scan_state["total"] = total
+        _scan_state["device"] = None
+        await _broadcast({**_scan_state, "message": f"Deep scanning {total} devices..."})
+
+        # One limiter for all hosts keeps the whole scan inside the pps budget;
+        # nmap shards get their own threads, one per allowed process
+        budget = max(1, pps_budget or DEFAULT_PPS_BUDGET)
+        workers = deep_workers(budget)
+        limiter = asyncio.Semaphore(workers)
+        nmap_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="deep-scan")
+        pending = [
+            asyncio.create_task(deep_scan_device(
+                ip, udp=udp, pps_budget=budget, limiter=limiter, executor=nmap_pool,
+            ))
+            for ip in targets
+        ]
+
+        try:
+            for done, fut in enumerate(asyncio.as_completed(pending), start=1):
+                result = await fut
+                _scan_state["current"] = done
+                _scan_state["device"] = result.ip
+                await _broadcast({**_scan_state})
+
+                device = db.query(Device).filter(Device.ip == result.ip).first()
+                if not device:
+                    continue
+                _sync_ports(db, device, result, scan.id, "deep")
+                device.icon_type = _infer_icon(device.vendor, device.hostname, result.ports)
+                db.flush()
+                index_device(db, device)
+                db.commit()
+        finally:
+            # On failure, drop queued shards and wait out running nmap processes
+            # so no scan traffic outlives the lock
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            nmap_pool.shutdown(wait=False)
+
+        scan.finished_at = datetime.utcnow()
+        scan.devices_found = total
+        scan.status = "done"
+        db.commit()
+
+        _scan_state["status"] = "done"
+        _scan_state["phase"] = "done"
+        await _broadcast({**_scan_state, "message": f"Deep scan complete. {total} devices scanned."})
+
+    except (Exception, asyncio.CancelledError) as exc:
+        lost = _lock_lost(heartbeat)
+        error = LOCK_LOST if lost else str(exc) or type(exc).__name__
+        _scan_state["status"] = "error"
+        _scan_state["error"] = error
+        scan.status = "error"
+        scan.error_msg = error
+        scan.finished_at = datetime.utcnow()
+        db.commit()
+        if not lost:  # the progress row now belongs to the other worker's scan
+            await _broadcast({**_scan_state, "message": f"Deep scan error: {error}"})
+        raise
+    finally:
+        heartbeat.cancel()
+        shared.release_scan()
         db.close()
 
 
 @router.post("")
 async def start_scan(db: Session = Depends(get_db)) -> dict:
-    if _scan_state["status"] == "running":
+    if not try_begin_scan():
         return {"status": "already_running"}
     # Fire and forget
     asyncio.create_task(run_scan())
     return {"status": "started"}
 
 
+class DeepScanBody(BaseModel):
+    udp: bool = True
+    pps_budget: int | None = None
+
+
+@router.post("/deep")
+async def start_deep_scan(body: DeepScanBody | None = None) -> dict:
+    if not try_begin_scan():
+        return {"status": "already_running"}
+    body = body or DeepScanBody()
+    asyncio.create_task(run_deep_scan(udp=body.udp, pps_budget=body.pps_budget))
+    return {"status": "started"}
+
+
 @router.get("/status")
 def scan_status() -> dict:
     return get_scan_state()
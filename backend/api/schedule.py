@@ -2,51 +2,178 @@
 from __future__ import annotations
 
 import asyncio
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from ..db.database import get_db
-from ..db.models import ScheduleConfig
+from ..db.models import ScanHistory, ScheduleConfig
+
+if TYPE_CHECKING:
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 _scheduler: AsyncIOScheduler | None = None
 JOB_ID = "auto_scan"
+DEEP_JOB_ID = "deep_scan"
+# While passive discovery is fresh, active sweeps run at most this many
+# times less often than the configured interval.
+PASSIVE_STRETCH = 4
+
 
+# Config last applied to _scheduler, so sync_schedule() only touches jobs on change
+_applied: tuple | None = None
 
-def set_scheduler(s: AsyncIOScheduler) -> None:
-    global _scheduler
+
+def set_scheduler(s: AsyncIOScheduler | None) -> None:
+    global _scheduler, _applied
     _scheduler = s
+    _applied = None
+
+
+def _passive_covers(interval_minutes: int) -> bool:
+    """True if passive discovery is fresh enough to skip this active sweep."""
+    from ..db.database import SessionLocal
+    from ..scanner.passive import get_listener
+
+    listener = get_listener()
+    interval = timedelta(minutes=interval_minutes)
+    if listener is None or not listener.is_fresh(interval):
+        return False
+    db = SessionLocal()
+    try:
+        last = (
+            db.query(ScanHistory.finished_at)
+            .filter(ScanHistory.status == "done", ScanHistory.kind == "sweep")
+            .order_by(ScanHistory.finished_at.desc())
+            .first()
+        )
+    finally:
+        db.close()
+    if not last or not last[0]:
+        return False
+    return datetime.utcnow() - last[0] < interval * PASSIVE_STRETCH
 
 
-async def _scheduled_scan() -> None:
-    from .scans import _scan_state, run_scan
-    if _scan_state["status"] != "running":
+async def _scheduled_scan(interval_minutes: int = 60) -> None:
+    from .scans import run_scan, try_begin_scan
+    if _passive_covers(interval_minutes):
+        return
+    if try_begin_scan():
         asyncio.create_task(run_scan())
 
 
+async def _scheduled_deep_scan(udp: bool = True, pps_budget: int | None = None) -> None:
+    from .scans import run_deep_scan, try_begin_scan
+    if try_begin_scan():
+        asyncio.create_task(run_deep_scan(udp=udp, pps_budget=pps_budget))
+
+
+def _config_key(cfg: ScheduleConfig) -> tuple:
+    return (
+        cfg.enabled, cfg.interval_minutes,
+        cfg.deep_enabled, cfg.deep_hour, cfg.deep_udp, cfg.deep_pps,
+    )
+
+
 def _apply_schedule(cfg: ScheduleConfig) -> None:
+    global _applied
     if _scheduler is None:
         return
-    if _scheduler.get_job(JOB_ID):
-        _scheduler.remove_job(JOB_ID)
+    _applied = _config_key(cfg)
+    for job_id in (JOB_ID, DEEP_JOB_ID):
+        if _scheduler.get_job(job_id):
+            _scheduler.remove_job(job_id)
     if cfg.enabled:
         _scheduler.add_job(
             _scheduled_scan,
             "interval",
             minutes=cfg.interval_minutes,
             id=JOB_ID,
+            kwargs={"interval_minutes": cfg.interval_minutes},
+        )
+    if cfg.deep_enabled:
+        # Off-peak, once a day, separate from the regular sweep
+        _scheduler.add_job(
+            _scheduled_deep_scan,
+            "cron",
+            hour=cfg.deep_hour,
+            id=DEEP_JOB_ID,
+            kwargs={"udp": cfg.deep_udp, "pps_budget": cfg.deep_pps},
         )
+    publish_schedule_status()
 
 
-def _cfg_response(cfg: ScheduleConfig) -> dict:
+def sync_schedule() -> None:
+    """Re-apply the saved config if it changed (e.g. PUT on another worker)."""
+    from ..db.database import SessionLocal
+
+    if _scheduler is None:
+        return
+    db = SessionLocal()
+    try:
+        cfg = db.query(ScheduleConfig).first()
+        if cfg and _config_key(cfg) != _applied:
+            _apply_schedule(cfg)
+    finally:
+        db.close()
+
+
+def _local_status() -> dict:
+    """Next run times and passive freshness as seen by the leader."""
+    from ..scanner.passive import get_listener
+
     job = _scheduler.get_job(JOB_ID) if _scheduler else None
-    next_run = job.next_run_time.isoformat() if job else None
+    deep_job = _scheduler.get_job(DEEP_JOB_ID) if _scheduler else None
+    listener = get_listener()
+    passive_at = listener.last_sighting_at if listener else None
+    return {
+        "next_run_at": job.next_run_time.isoformat() if job else None,
+        "deep_next_run_at": deep_job.next_run_time.isoformat() if deep_job else None,
+        "passive_enabled": listener is not None,
+        "passive_last_seen_at": passive_at.isoformat() + "Z" if passive_at else None,
+    }
+
+
+_NO_STATUS = {
+    "next_run_at": None,
+    "deep_next_run_at": None,
+    "passive_enabled": False,
+    "passive_last_seen_at": None,
+}
+
+
+def publish_schedule_status() -> None:
+    """Share the leader's status so /api/schedule is right on every worker."""
+    from ..db import shared
+
+    if _scheduler is not None:
+        shared.save_scheduler_status(_local_status())
+
+
+def _schedule_status() -> dict:
+    from ..db import shared
+
+    if _scheduler is not None:
+        return _local_status()
+    return shared.load_scheduler_status() or _NO_STATUS
+
+
+def _cfg_response(cfg: ScheduleConfig) -> dict:
+    status = _schedule_status()
     return {
         "enabled": cfg.enabled,
         "interval_minutes": cfg.interval_minutes,
-        "next_run_at": next_run,
+        "next_run_at": status["next_run_at"],
+        "deep_enabled": cfg.deep_enabled,
+        "deep_hour": cfg.deep_hour,
+        "deep_udp": cfg.deep_udp,
+        "deep_pps": cfg.deep_pps,
+        "deep_next_run_at": status["deep_next_run_at"],
+        "passive_enabled": status["passive_enabled"],
+        "passive_last_seen_at": status["passive_last_seen_at"],
     }
 
 
@@ -56,6 +183,10 @@ router = APIRouter(prefix="/api/schedule", tags=["schedule"])
 class ScheduleBody(BaseModel):
     enabled: bool
     interval_minutes: int
+    deep_enabled: bool | None = None
+    deep_hour: int | None = None
+    deep_udp: bool | None = None
+    deep_pps: int | None = None
 
 
 @router.get("")
@@ -74,6 +205,14 @@ def put_schedule(body: ScheduleBody, db: Session = Depends(get_db)):
         db.add(cfg)
     cfg.enabled = body.enabled
     cfg.interval_minutes = max(1, body.interval_minutes)
+    if body.deep_enabled is not None:
+        cfg.deep_enabled = body.deep_enabled
+    if body.deep_hour is not None:
+        cfg.deep_hour = min(23, max(0, body.deep_hour))
+    if body.deep_udp is not None:
+        cfg.deep_udp = body.deep_udp
+    if body.deep_pps is not None:
+        cfg.deep_pps = max(1, body.deep_pps)
     db.commit()
     _apply_schedule(cfg)
     return _cfg_response(cfg)
@@ -0,0 +1,65 @@
+"""Which ports each kind of port scan last covered, per device.
+
+Unchanged open ports are never rewritten by a scan (see ``_sync_ports``), so
+``Port.last_seen`` only records the last change. An open port was last seen
+by the most recent scan whose coverage includes it: the regular sweep probes
+the top TCP ports, a deep scan the full TCP range plus some UDP services.
+"""
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable
+
+KINDS = ("sweep", "deep")
+
+Scans = Iterable[tuple[datetime | None, str | None]]  # (scanned_at, coverage) per kind
+
+
+def dump_coverage(scanned: dict[str, list[tuple[int, int]]]) -> str:
+    return json.dumps({proto: [list(r) for r in ranges] for proto, ranges in sorted(scanned.items())})
+
+
+@lru_cache(maxsize=256)
+def _load(coverage: str) -> dict[str, tuple[tuple[int, int], ...]]:
+    return {proto: tuple((lo, hi) for lo, hi in ranges) for proto, ranges in json.loads(coverage).items()}
+
+
+def covers(coverage: str | None, port: int, protocol: str) -> bool:
+    if not coverage:
+        return False
+    return any(lo <= port <= hi for lo, hi in _load(coverage).get(protocol, ()))
+
+
+def device_scans(device) -> list[tuple[datetime | None, str | None]]:
+    return [
+        (getattr(device, f"{kind}_scanned_at"), getattr(device, f"{kind}_coverage"))
+        for kind in KINDS
+    ]
+
+
+def port_last_seen(
+    last_seen: datetime | None,
+    closed_at: datetime | None,
+    port: int,
+    protocol: str,
+    scans: Scans,
+) -> datetime | None:
+    """Last time the port was seen open: its last change or a later covering scan."""
+    if closed_at is not None:
+        return last_seen
+    for scanned_at, coverage in scans:
+        if scanned_at and (last_seen is None or scanned_at > last_seen) and covers(coverage, port, protocol):
+            last_seen = scanned_at
+    return last_seen
+
+
+def record_scan(device, kind: str, scanned: dict[str, list[tuple[int, int]]], at: datetime) -> None:
+    """Remember that a ``kind`` scan covering ``scanned`` ran on the device at ``at``."""
+    if kind not in KINDS:
+        raise ValueError(f"unknown scan kind {kind!r}")
+    if not scanned:
+        return  # nothing was probed (host down or nmap failed); keep the previous scan
+    setattr(device, f"{kind}_scanned_at", at)
+    setattr(device, f"{kind}_coverage", dump_coverage(scanned))
@@ -1,5 +1,8 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+import json
 import os
 
 DB_PATH = os.environ.get("DB_PATH", "scanner.db")
@@ -10,6 +13,16 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
 )
 
+
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record) -> None:
+    # WAL lets API workers read while a scan in another process writes
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA busy_timeout=5000")
+    cur.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -23,3 +36,80 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@contextmanager
+def schema_lock():
+    """Serialise create_all/migrate when several workers start at once."""
+    try:
+        import fcntl
+    except ImportError:  # not POSIX — single worker only
+        yield
+        return
+    with open(f"{DB_PATH}.lock", "w") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def migrate() -> None:
+    """Bring tables created by an older version up to date.
+
+    ``create_all`` only creates missing tables, so columns added to a model
+    later are appended here with ``ALTER TABLE``.
+    """
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            have = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in have:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {col_type}'))
+
+        if "ports" in existing_tables:
+            # Ports used to be deleted and re-inserted every scan; keep one row
+            # per (device, port, protocol) so the upsert key is enforced.
+            conn.execute(text(
+                "DELETE FROM ports WHERE id NOT IN ("
+                "SELECT MAX(id) FROM ports GROUP BY device_id, port, protocol)"
+            ))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_ports_device_port_protocol "
+                "ON ports (device_id, port, protocol)"
+            ))
+            conn.execute(text("UPDATE ports SET first_seen = last_seen WHERE first_seen IS NULL"))
+
+        if "scan_history" in existing_tables:
+            conn.execute(text("UPDATE scan_history SET kind = 'sweep' WHERE kind IS NULL"))
+        if "schedule_config" in existing_tables:
+            conn.execute(text(
+                "UPDATE schedule_config SET deep_enabled = COALESCE(deep_enabled, 0), "
+                "deep_hour = COALESCE(deep_hour, 3), deep_udp = COALESCE(deep_udp, 1), "
+                "deep_pps = COALESCE(deep_pps, 1000)"
+            ))
+
+        device_cols = {c["name"] for c in insp.get_columns("devices")} if "devices" in existing_tables else set()
+        if "tags" in device_cols:
+            # Tags used to be a JSON array string on the device row
+            rows = conn.execute(text("SELECT id, tags FROM devices WHERE tags IS NOT NULL")).all()
+            for device_id, raw in rows:
+                try:
+                    tags = json.loads(raw)
+                except Exception:
+                    tags = []
+                for tag in dict.fromkeys(str(t) for t in tags if t):
+                    conn.execute(
+                        text("INSERT OR IGNORE INTO device_tags (device_id, tag) VALUES (:d, :t)"),
+                        {"d": device_id, "t": tag},
+                    )
+            conn.execute(text("UPDATE devices SET tags = NULL"))
+
+        # The one cross-worker scan lock row (db/shared.py)
+        conn.execute(text("INSERT OR IGNORE INTO scan_state (id) VALUES (1)"))
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -15,12 +15,21 @@ class Device(Base):
     os = Column(String, nullable=True)
     nickname = Column(String, nullable=True)
     icon_type = Column(String, default="device")  # router, phone, laptop, tv, printer, device
-    tags = Column(Text, nullable=True)  # JSON array string
     first_seen = Column(DateTime, default=datetime.utcnow)
     last_seen = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_online = Column(Boolean, default=True)
+    # Latest port scan of each kind and the ranges it probed (see db/coverage.py)
+    sweep_scanned_at = Column(DateTime, nullable=True)
+    sweep_coverage = Column(Text, nullable=True)
+    deep_scanned_at = Column(DateTime, nullable=True)
+    deep_coverage = Column(Text, nullable=True)
 
     ports = relationship("Port", back_populates="device", cascade="all, delete-orphan")
+    tag_rows = relationship(
+        "DeviceTag", back_populates="device",
+        cascade="all, delete-orphan",
+        order_by="DeviceTag.id",
+    )
     scan_records = relationship(
         "DeviceScanRecord", back_populates="device",
         cascade="all, delete-orphan",
@@ -28,8 +37,24 @@ class Device(Base):
     )
 
 
+class DeviceTag(Base):
+    __tablename__ = "device_tags"
+    __table_args__ = (
+        UniqueConstraint("device_id", "tag", name="uq_device_tags_device_tag"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
+    tag = Column(String, nullable=False, index=True)
+
+    device = relationship("Device", back_populates="tag_rows")
+
+
 class Port(Base):
     __tablename__ = "ports"
+    __table_args__ = (
+        UniqueConstraint("device_id", "port", "protocol", name="uq_ports_device_port_protocol"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
@@ -37,10 +62,31 @@ class Port(Base):
     protocol = Column(String, default="tcp")
     service = Column(String, nullable=True)
     version = Column(String, nullable=True)
-    state = Column(String, default="open")
-    last_seen = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    state = Column(String, default="open")  # open, closed
+    first_seen = Column(DateTime, default=datetime.utcnow)
+    last_seen = Column(DateTime, default=datetime.utcnow)
+    closed_at = Column(DateTime, nullable=True)  # set while the port is closed
 
     device = relationship("Device", back_populates="ports")
+    events = relationship(
+        "PortEvent", back_populates="port",
+        cascade="all, delete-orphan",
+        order_by="PortEvent.at.desc()",
+    )
+
+
+class PortEvent(Base):
+    __tablename__ = "port_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    port_id = Column(Integer, ForeignKey("ports.id"), nullable=False, index=True)
+    scan_id = Column(Integer, ForeignKey("scan_history.id"), nullable=True)
+    event = Column(String, nullable=False)  # opened, changed, closed
+    service = Column(String, nullable=True)
+    version = Column(String, nullable=True)
+    at = Column(DateTime, default=datetime.utcnow)
+
+    port = relationship("Port", back_populates="events")
 
 
 class ScanHistory(Base):
@@ -51,6 +97,7 @@ class ScanHistory(Base):
     finished_at = Column(DateTime, nullable=True)
     devices_found = Column(Integer, default=0)
     status = Column(String, default="running")  # running, done, error
+    kind = Column(String, default="sweep")  # sweep, deep
     error_msg = Column(Text, nullable=True)
 
 
@@ -73,3 +120,54 @@ class ScheduleConfig(Base):
     id               = Column(Integer, primary_key=True, default=1)
     enabled          = Column(Boolean, default=False)
     interval_minutes = Column(Integer, default=60)
+    deep_enabled     = Column(Boolean, default=False)
+    deep_hour        = Column(Integer, default=3)     # local hour for the nightly deep scan
+    deep_udp         = Column(Boolean, default=True)
+    deep_pps         = Column(Integer, default=1000)  # packets/second budget
+
+
+class NameCacheEntry(Base):
+    __tablename__ = "name_cache"
+
+    ip          = Column(String, primary_key=True)
+    mac         = Column(String, nullable=True)   # entry is stale if the MAC changes
+    name        = Column(String, nullable=True)   # None caches a miss
+    source      = Column(String, nullable=True)   # ptr, mdns, netbios
+    resolved_at = Column(DateTime, default=datetime.utcnow)
+    expires_at  = Column(DateTime, nullable=False)
+
+
+# ── Cross-worker coordination (see db/shared.py) ─────────────────────────────
+
+class ScanStateRow(Base):
+    __tablename__ = "scan_state"
+
+    id           = Column(Integer, primary_key=True, default=1)
+    state        = Column(Text, nullable=True)     # JSON progress dict
+    owner        = Column(String, nullable=True)   # worker running the scan
+    heartbeat_at = Column(DateTime, nullable=True)
+
+
+class Lease(Base):
+    __tablename__ = "leases"
+
+    name       = Column(String, primary_key=True)
+    owner      = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class BroadcastEvent(Base):
+    __tablename__ = "broadcast_events"
+
+    id         = Column(Integer, primary_key=True, autoincrement=True)
+    payload    = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class SchedulerStatusRow(Base):
+    __tablename__ = "scheduler_status"
+
+    id         = Column(Integer, primary_key=True, default=1)
+    status     = Column(Text, nullable=False)     # JSON: next runs + passive freshness
+    owner      = Column(String, nullable=False)   # leader that wrote it
+    updated_at = Column(DateTime, nullable=False)
@@ -0,0 +1,110 @@
+"""SQLite FTS5 index over the device inventory.
+
+Every writer re-indexes the devices it changes before committing, in the same
+transaction, so a scan or import that fails partway can't leave the index out
+of step with the devices table.
+"""
+from __future__ import annotations
+
+import re
+
+from sqlalchemy import Integer, column, select, table, text
+from sqlalchemy.orm import Session, selectinload
+
+from .database import engine
+from .models import Device
+
+FTS_TABLE = "device_fts"
+# Bump to force one full rebuild on next start, e.g. after changing what is
+# indexed or to repair drift left by older versions
+INDEX_VERSION = 2
+
+_fts = table(FTS_TABLE, column("rowid", Integer))
+
+
+def ensure_search_index() -> bool:
+    """Create the FTS table; True if it needs a rebuild (old version or row count)."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "hostname, vendor, nickname, tags, os, services, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {FTS_TABLE}_meta (version INTEGER NOT NULL)"))
+        version = conn.execute(text(f"SELECT MAX(version) FROM {FTS_TABLE}_meta")).scalar()
+        indexed = conn.execute(text(f"SELECT COUNT(*) FROM {FTS_TABLE}")).scalar()
+        devices = conn.execute(text("SELECT COUNT(*) FROM devices")).scalar()
+    return version != INDEX_VERSION or indexed != devices
+
+
+def rebuild_search_index(db: Session | None = None) -> None:
+    """Re-index every device; with ``db`` it joins the caller's transaction."""
+    if db is not None:
+        _reindex_all(db)
+        return
+
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        _reindex_all(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _reindex_all(db: Session) -> None:
+    db.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    db.execute(text(f"DELETE FROM {FTS_TABLE}_meta"))
+    db.execute(text(f"INSERT INTO {FTS_TABLE}_meta (version) VALUES (:v)"), {"v": INDEX_VERSION})
+    devices = (
+        db.query(Device)
+        .options(selectinload(Device.ports), selectinload(Device.tag_rows))
+        .all()
+    )
+    for device in devices:
+        index_device(db, device)
+
+
+def index_device(db: Session, device: Device) -> None:
+    """Replace the device's FTS row. Caller commits."""
+    services = " ".join(
+        " ".join(filter(None, (p.service, (p.version or "").strip())))
+        for p in device.ports
+        if p.closed_at is None
+    )
+    db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": device.id})
+    db.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} (rowid, hostname, vendor, nickname, tags, os, services) "
+            "VALUES (:id, :hostname, :vendor, :nickname, :tags, :os, :services)"
+        ),
+        {
+            "id": device.id,
+            "hostname": device.hostname or "",
+            "vendor": device.vendor or "",
+            "nickname": device.nickname or "",
+            "tags": " ".join(t.tag for t in device.tag_rows),
+            "os": device.os or "",
+            "services": services,
+        },
+    )
+
+
+def match_expression(q: str) -> str | None:
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def matching_ids(q: str):
+    """Select of device ids matching free text ``q``, or None for an empty query."""
+    expr = match_expression(q)
+    if expr is None:
+        return None
+    return (
+        select(_fts.c.rowid)
+        .where(text(f"{FTS_TABLE} MATCH :fts_q").bindparams(fts_q=expr))
+    )
@@ -0,0 +1,229 @@
+"""SQLite-backed state shared between uvicorn worker processes.
+
+- Scan lock + progress: one ``scan_state`` row. A worker takes it with a
+  compare-and-swap on the previous owner and keeps it alive with heartbeats,
+  so exactly one scan runs at a time across all workers.
+- Leases: named, expiring ownership used to elect the one worker that runs
+  the scheduler and the passive listener.
+- Broadcast events: scan progress is appended to ``broadcast_events`` and
+  every worker relays new rows to its own WebSocket clients.
+- Scheduler status: the leader writes its next run times and passive
+  listener freshness to ``scheduler_status`` so any worker can report them.
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from .database import engine
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+SCAN_STALE_AFTER = timedelta(minutes=2)
+EVENT_RETENTION = timedelta(minutes=5)
+# Leader checks refresh the status every 10 s; older means no live leader
+SCHEDULER_STATUS_STALE_AFTER = timedelta(minutes=1)
+
+
+def _owner_dead(owner: str | None) -> bool:
+    """True if ``owner`` is a process on this host that no longer exists."""
+    if not owner:
+        return False
+    host, _, rest = owner.partition(":")
+    pid = rest.partition(":")[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def _is_stale(owner: str | None, heartbeat_at: datetime | None) -> bool:
+    if owner is None:
+        return True
+    if heartbeat_at is None or datetime.utcnow() - heartbeat_at > SCAN_STALE_AFTER:
+        return True
+    return _owner_dead(owner)
+
+
+def _ts(value: datetime) -> str:
+    # Same text format SQLAlchemy's DateTime uses on SQLite, so comparisons line up
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _parse_dt(value) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+# ── Scan lock and progress ────────────────────────────────────────────────────
+
+def _scan_row(conn) -> tuple[str | None, str | None, datetime | None]:
+    # The row itself is created once by migrate()
+    row = conn.execute(
+        text("SELECT state, owner, heartbeat_at FROM scan_state WHERE id = 1")
+    ).first()
+    if row is None:
+        return None, None, None
+    state, owner, heartbeat_at = row
+    return state, owner, _parse_dt(heartbeat_at)
+
+
+def try_acquire_scan() -> bool:
+    """Claim the scan lock for this worker; False if another scan is running."""
+    with engine.begin() as conn:
+        _, owner, heartbeat_at = _scan_row(conn)
+        if not _is_stale(owner, heartbeat_at):
+            return False
+        result = conn.execute(
+            text(
+                "UPDATE scan_state SET owner = :me, heartbeat_at = :now "
+                "WHERE id = 1 AND owner IS :prev"
+            ),
+            {"me": WORKER_ID, "now": _ts(datetime.utcnow()), "prev": owner},
+        )
+        return result.rowcount == 1
+
+
+def release_scan() -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text("UPDATE scan_state SET owner = NULL WHERE id = 1 AND owner = :me"),
+            {"me": WORKER_ID},
+        )
+
+
+def heartbeat_scan() -> bool:
+    """Refresh the lock; False if this worker no longer owns it."""
+    with engine.begin() as conn:
+        result = conn.execute(
+            text("UPDATE scan_state SET heartbeat_at = :now WHERE id = 1 AND owner = :me"),
+            {"now": _ts(datetime.utcnow()), "me": WORKER_ID},
+        )
+    return result.rowcount == 1
+
+
+def save_scan_state(state: dict) -> None:
+    """Persist the progress dict (and refresh the heartbeat) as the lock owner."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE scan_state SET state = :state, heartbeat_at = :now "
+                "WHERE id = 1 AND owner = :me"
+            ),
+            {"state": json.dumps(state), "now": _ts(datetime.utcnow()), "me": WORKER_ID},
+        )
+
+
+def load_scan_state() -> dict | None:
+    """Latest progress dict from whichever worker ran the scan."""
+    with engine.connect() as conn:
+        state, owner, heartbeat_at = _scan_row(conn)
+    if not state:
+        return None
+    data = json.loads(state)
+    if data.get("status") == "running" and _is_stale(owner, heartbeat_at):
+        data["status"] = "error"
+        data["error"] = "Scan worker stopped unexpectedly"
+    return data
+
+
+# ── Leases ────────────────────────────────────────────────────────────────────
+
+def try_lease(name: str, ttl: timedelta) -> bool:
+    """Take or renew lease ``name``; True while this worker holds it."""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (:name, :me, :exp) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, "
+                "expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < :now"
+            ),
+            {"name": name, "me": WORKER_ID, "exp": _ts(now + ttl), "now": _ts(now)},
+        )
+        owner = conn.execute(
+            text("SELECT owner FROM leases WHERE name = :name"), {"name": name}
+        ).scalar()
+    return owner == WORKER_ID
+
+
+def release_lease(name: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text("DELETE FROM leases WHERE name = :name AND owner = :me"),
+            {"name": name, "me": WORKER_ID},
+        )
+
+
+# ── Scheduler status ──────────────────────────────────────────────────────────
+
+def save_scheduler_status(status: dict) -> None:
+    """Publish the leader's schedule/passive status for the other workers."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO scheduler_status (id, status, owner, updated_at) "
+                "VALUES (1, :status, :me, :now) "
+                "ON CONFLICT(id) DO UPDATE SET status = excluded.status, "
+                "owner = excluded.owner, updated_at = excluded.updated_at"
+            ),
+            {"status": json.dumps(status), "me": WORKER_ID, "now": _ts(datetime.utcnow())},
+        )
+
+
+def load_scheduler_status() -> dict | None:
+    """Status last published by the leader, or None if it is missing or stale."""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT status, updated_at FROM scheduler_status WHERE id = 1")
+        ).first()
+    if row is None:
+        return None
+    updated_at = _parse_dt(row[1])
+    if updated_at is None or datetime.utcnow() - updated_at > SCHEDULER_STATUS_STALE_AFTER:
+        return None
+    return json.loads(row[0])
+
+
+# ── Broadcast events ──────────────────────────────────────────────────────────
+
+def publish(msg: dict) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO broadcast_events (payload, created_at) VALUES (:p, :now)"),
+            {"p": json.dumps(msg), "now": _ts(datetime.utcnow())},
+        )
+
+
+def latest_event_id() -> int:
+    with engine.begin() as conn:
+        return conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM broadcast_events")).scalar()
+
+
+def events_since(last_id: int, limit: int = 500) -> list[tuple[int, dict]]:
+    with engine.begin() as conn:
+        rows = conn.execute(
+            text("SELECT id, payload FROM broadcast_events WHERE id > :last ORDER BY id LIMIT :lim"),
+            {"last": last_id, "lim": limit},
+        ).all()
+    return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+
+def prune_events() -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text("DELETE FROM broadcast_events WHERE created_at < :cutoff"),
+            {"cutoff": _ts(datetime.utcnow() - EVENT_RETENTION)},
+        )
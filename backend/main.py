@@ -3,21 +3,41 @@ from __future__ import annotations
 
 import asyncio
 import json
+import logging
 import os
 from contextlib import asynccontextmanager
+from datetime import timedelta
 from pathlib import Path
 from typing import Any
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.exc import OperationalError
 
-from .db.database import SessionLocal, engine
-from .db.models import Base, ScheduleConfig
+from .db import shared
+from .db.database import engine, migrate, schema_lock
+from .db.models import Base
+from .db.search import ensure_search_index, rebuild_search_index
+from .api.bulk import router as bulk_router
 from .api.devices import router as devices_router
-from .api.scans import router as scans_router, set_broadcast
-from .api.schedule import router as schedule_router, set_scheduler, _apply_schedule
+from .api.scans import router as scans_router
+from .api.schedule import (
+    publish_schedule_status, router as schedule_router, set_scheduler, sync_schedule,
+)
+from .scanner.passive import start_listener, stop_listener
+from .scanner.vendor import preload as preload_vendors
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE = "scheduler"
+LEADER_TTL = timedelta(seconds=30)
+LEADER_CHECK_SECONDS = 10
+RELAY_POLL_SECONDS = 0.25
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
 
 
 # ── WebSocket ─────────────────────────────────────────────────────────────────
@@ -49,27 +69,111 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+# ── Cross-worker coordination ─────────────────────────────────────────────────
+
+async def _relay_events() -> None:
+    """Forward scan events published by any worker to this worker's sockets."""
+    loop = asyncio.get_running_loop()
+    last_id = await loop.run_in_executor(None, shared.latest_event_id)
+    while True:
+        await asyncio.sleep(RELAY_POLL_SECONDS)
+        try:
+            events = await loop.run_in_executor(None, shared.events_since, last_id)
+        except OperationalError:  # database busy; pick them up next poll
+            continue
+        for last_id, msg in events:
+            await manager.broadcast(msg)
+
+
+class _Leadership:
+    """Runs the scheduler and passive listener in exactly one worker.
+
+    The worker holding the "scheduler" lease owns both; others keep trying
+    so that one takes over within LEADER_TTL if the leader exits.
+    """
+
+    def __init__(self):
+        self.scheduler = None
+
+    async def check(self) -> None:
+        if shared.try_lease(LEADER_LEASE, LEADER_TTL):
+            if self.scheduler is None:
+                try:
+                    await self._lead()
+                except Exception:
+                    # Holding a scheduler must always mean holding the lease
+                    await self.step_down()
+                    shared.release_lease(LEADER_LEASE)
+                    raise
+            sync_schedule()
+            publish_schedule_status()
+            shared.prune_events()
+        elif self.scheduler is not None:
+            await self.step_down()
+
+    async def _lead(self) -> None:
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        self.scheduler = AsyncIOScheduler()
+        self.scheduler.start()
+        set_scheduler(self.scheduler)
+        # Optional passive ARP/DHCP/mDNS listener; without it we still schedule
+        if _env_flag("PASSIVE_DISCOVERY"):
+            try:
+                await start_listener(iface=os.environ.get("PASSIVE_IFACE") or None)
+            except Exception:
+                logger.warning("passive discovery unavailable, continuing without it",
+                               exc_info=True)
+
+    async def step_down(self) -> None:
+        if self.scheduler is None:
+            return
+        scheduler, self.scheduler = self.scheduler, None
+        set_scheduler(None)
+        try:
+            await stop_listener()
+        finally:
+            if scheduler.running:
+                scheduler.shutdown(wait=False)
+
+    async def tick(self) -> None:
+        try:
+            await self.check()
+        except OperationalError:  # database busy; the lease outlives one miss
+            pass
+        except Exception:
+            logger.exception("scheduler leadership check failed")
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(LEADER_CHECK_SECONDS)
+            await self.tick()
+
+
 # ── Lifespan ──────────────────────────────────────────────────────────────────
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create DB tables
-    Base.metadata.create_all(bind=engine)
-    # Wire broadcast into scan module
-    set_broadcast(manager.broadcast)
-    # Start scheduler and restore saved config
-    scheduler = AsyncIOScheduler()
-    scheduler.start()
-    set_scheduler(scheduler)
-    db = SessionLocal()
-    try:
-        cfg = db.query(ScheduleConfig).first()
-        if cfg:
-            _apply_schedule(cfg)
-    finally:
-        db.close()
+    with schema_lock():
+        Base.metadata.create_all(bind=engine)
+        migrate()
+        search_stale = ensure_search_index()
+    # Slow warm-ups run in the background so requests are served right away
+    loop = asyncio.get_running_loop()
+    background: list[asyncio.Future] = [asyncio.create_task(preload_vendors())]
+    if search_stale:
+        background.append(loop.run_in_executor(None, rebuild_search_index))
+    # Scan progress from every worker reaches this worker's WebSocket clients
+    background.append(asyncio.create_task(_relay_events()))
+    # First worker to start takes the scheduler (and passive listener) right away
+    leadership = _Leadership()
+    await leadership.tick()
+    background.append(asyncio.create_task(leadership.run()))
     yield
-    scheduler.shutdown(wait=False)
+    for fut in background:
+        fut.cancel()
+    await leadership.step_down()
+    shared.release_lease(LEADER_LEASE)
 
 
 # ── App ───────────────────────────────────────────────────────────────────────
@@ -88,6 +192,7 @@ app.add_middleware(
 app.include_router(devices_router)
 app.include_router(scans_router)
 app.include_router(schedule_router)
+app.include_router(bulk_router)
 
 
 @app.websocket("/ws")
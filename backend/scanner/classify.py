@@ -0,0 +1,213 @@
+"""Rule-driven device classifier.
+
+Rules live in ``device_rules.json`` (override with ``CLASSIFIER_RULES``) and are
+evaluated in file order; the first rule whose conditions all hold wins. Each
+rule may constrain:
+
+- ``vendor`` / ``hostname``: any keyword occurs as a substring (case-insensitive)
+- ``ports_any`` / ``ports_all`` / ``ports_none``: open-port conditions
+
+All keywords are compiled into one combined regex per field and all ports
+into a bitmask, so classifying a device is a single regex pass over its vendor
+and hostname plus a few integer ANDs per rule.
+
+Reclassify the whole inventory after editing the rules with:
+
+    python -m backend.scanner.classify
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+RULES_PATH = Path(os.environ.get("CLASSIFIER_RULES", Path(__file__).parent / "device_rules.json"))
+
+
+@dataclass(frozen=True)
+class Classification:
+    category: str
+    confidence: float
+    rule: int | None = None  # index into the rules file; None for the default
+
+
+class _Matcher:
+    """Combined-regex keyword matcher returning a bitmask of the keywords found.
+
+    A zero-width lookahead tries every start offset, and the alternation is
+    ordered longest-first so each hit is the longest keyword at that offset.
+    Any other keyword matching at the same offset is a prefix of it, so each
+    hit maps to the mask of the keyword and all of its keyword prefixes.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.bits: dict[str, int] = {}
+        for kw in keywords:
+            self.bits.setdefault(kw, 1 << len(self.bits))
+        self._hit_mask = {
+            kw: self.keyword_mask(k for k in self.bits if kw.startswith(k))
+            for kw in self.bits
+        }
+        ordered = sorted(self.bits, key=len, reverse=True)
+        self._re = re.compile("(?=(" + "|".join(map(re.escape, ordered)) + "))") if ordered else None
+        # Vendor strings repeat across an inventory, so most lookups are cache hits
+        self.mask = lru_cache(maxsize=4096)(self._mask)
+
+    def _mask(self, text: str | None) -> int:
+        if not text or self._re is None:
+            return 0
+        hit_mask = self._hit_mask
+        found = 0
+        for m in self._re.finditer(text.lower()):
+            found |= hit_mask[m.group(1)]
+        return found
+
+    def keyword_mask(self, keywords: Iterable[str]) -> int:
+        m = 0
+        for kw in keywords:
+            m |= self.bits[kw]
+        return m
+
+
+@dataclass(frozen=True)
+class _Rule:
+    category: str
+    confidence: float
+    vendor: int
+    hostname: int
+    ports_any: int
+    ports_all: int
+    ports_none: int
+
+
+class Classifier:
+    def __init__(self, spec: dict):
+        rules = spec.get("rules", [])
+        self.default = spec.get("default", "device")
+
+        def kws(rule: dict, field: str) -> list[str]:
+            return [k.lower() for k in rule.get(field, [])]
+
+        self._vendor = _Matcher(k for r in rules for k in kws(r, "vendor"))
+        self._hostname = _Matcher(k for r in rules for k in kws(r, "hostname"))
+
+        all_ports = sorted({
+            p for r in rules
+            for field in ("ports_any", "ports_all", "ports_none")
+            for p in r.get(field, [])
+        })
+        self._port_bits = {p: 1 << i for i, p in enumerate(all_ports)}
+
+        self._rules = [
+            _Rule(
+                category=r["category"],
+                confidence=float(r.get("confidence", 0.5)),
+                vendor=self._vendor.keyword_mask(kws(r, "vendor")),
+                hostname=self._hostname.keyword_mask(kws(r, "hostname")),
+                ports_any=self._mask_ports(r.get("ports_any", [])),
+                ports_all=self._mask_ports(r.get("ports_all", [])),
+                ports_none=self._mask_ports(r.get("ports_none", [])),
+            )
+            for r in rules
+        ]
+        self._masks = [
+            (r.vendor, r.hostname, r.ports_any, r.ports_all, r.ports_none) for r in self._rules
+        ]
+
+    def _mask_ports(self, ports: Iterable[int]) -> int:
+        m = 0
+        for p in ports:
+            m |= self._port_bits.get(p, 0)
+        return m
+
+    def classify(
+        self, vendor: str | None, hostname: str | None, open_ports: Iterable[int]
+    ) -> Classification:
+        vmask = self._vendor.mask(vendor)
+        hmask = self._hostname.mask(hostname)
+        pmask = self._mask_ports(open_ports)
+
+        for i, (vendor_m, host_m, any_m, all_m, none_m) in enumerate(self._masks):
+            if vendor_m and not vmask & vendor_m:
+                continue
+            if host_m and not hmask & host_m:
+                continue
+            if any_m and not pmask & any_m:
+                continue
+            if pmask & all_m != all_m or pmask & none_m:
+                continue
+            r = self._rules[i]
+            return Classification(r.category, r.confidence, i)
+        return Classification(self.default, 0.0)
+
+
+_loaded: tuple[int, Classifier] | None = None  # (rules file mtime, classifier)
+
+
+def get_classifier() -> Classifier:
+    """Classifier for the rules on disk; reloaded whenever the file changes.
+
+    A running server therefore picks up edited rules on its next scan. If the
+    edited file doesn't load, the previous rules stay in use.
+    """
+    global _loaded
+    try:
+        mtime = RULES_PATH.stat().st_mtime_ns
+    except OSError:
+        # Briefly missing while an editor replaces it
+        if _loaded is None:
+            raise
+        return _loaded[1]
+    if _loaded is None or _loaded[0] != mtime:
+        try:
+            with open(RULES_PATH) as f:
+                clf = Classifier(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            if _loaded is None:
+                raise
+            clf = _loaded[1]
+        _loaded = (mtime, clf)
+    return _loaded[1]
+
+
+def reclassify_all(db, batch_size: int = 1000) -> int:
+    """Re-run the classifier over every device; returns how many changed."""
+    from sqlalchemy import update
+
+    from ..db.models import Device, Port
+
+    clf = get_classifier()
+    open_ports: dict[int, list[int]] = {}
+    for device_id, port in (
+        db.query(Port.device_id, Port.port).filter(Port.closed_at.is_(None)).yield_per(batch_size)
+    ):
+        open_ports.setdefault(device_id, []).append(port)
+
+    changes: list[dict] = []
+    rows = db.query(
+        Device.id, Device.vendor, Device.hostname, Device.icon_type, Device.last_seen
+    ).yield_per(batch_size)
+    for device_id, vendor, hostname, icon_type, last_seen in rows:
+        category = clf.classify(vendor, hostname, open_ports.get(device_id, ())).category
+        if category != icon_type:
+            # last_seen is passed through so its onupdate default does not fire
+            changes.append({"id": device_id, "icon_type": category, "last_seen": last_seen})
+
+    for i in range(0, len(changes), batch_size):
+        db.execute(update(Device), changes[i:i + batch_size])
+    db.commit()
+    return len(changes)
+
+
+if __name__ == "__main__":
+    from ..db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"{reclassify_all(db)} devices reclassified")
+    finally:
+        db.close()
@@ -0,0 +1,28 @@
+"""DNS wire-format name helpers shared by passive discovery and name resolution."""
+from __future__ import annotations
+
+
+def read_name(msg: bytes, offset: int) -> tuple[str, int]:
+    """Decode a (possibly compressed) DNS name; returns (name, next offset)."""
+    labels: list[str] = []
+    end = None
+    for _ in range(64):
+        length = msg[offset]
+        if length == 0:
+            offset += 1
+            break
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | msg[offset + 1]
+            continue
+        labels.append(msg[offset + 1:offset + 1 + length].decode("utf-8", "replace"))
+        offset += 1 + length
+    else:
+        raise ValueError("DNS name too long")
+    return ".".join(labels), end if end is not None else offset
+
+
+def encode_name(name: str) -> bytes:
+    """Encode a dotted name as uncompressed DNS labels."""
+    return b"".join(bytes([len(label)]) + label.encode() for label in name.split(".") if label) + b"\x00"
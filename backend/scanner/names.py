@@ -0,0 +1,268 @@
+"""Hostname resolution via reverse DNS, mDNS and NetBIOS with a persistent TTL cache.
+
+All three lookups run concurrently per host (bounded across hosts); the first
+answer in SOURCES order wins. Answers, including misses, are cached in the
+``name_cache`` table keyed on IP and invalidated if the MAC at that IP changes.
+
+Tests can swap in canned answers with ``set_resolver(StubResolver(...))``.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import socket
+import struct
+from datetime import datetime, timedelta
+from typing import Callable
+
+from .dns import encode_name, read_name
+
+SOURCES = ("ptr", "mdns", "netbios")  # preference order
+POSITIVE_TTL = timedelta(hours=24)
+NEGATIVE_TTL = timedelta(hours=1)
+NAME_CONCURRENCY = 32
+QUERY_TIMEOUT = 1.5
+
+NETBIOS_PORT = 137
+MDNS_PORT = 5353
+DNS_TYPE_PTR = 12
+NETBIOS_TYPE_NBSTAT = 0x21
+
+
+def _reverse_name(ip: str) -> str:
+    return ".".join(reversed(ip.split("."))) + ".in-addr.arpa"
+
+
+def _clean(name: str | None) -> str | None:
+    name = (name or "").strip().rstrip(".")
+    return name or None
+
+
+async def _udp_query(ip: str, port: int, payload: bytes, timeout: float) -> bytes | None:
+    loop = asyncio.get_running_loop()
+    reply: asyncio.Future[bytes | None] = loop.create_future()
+
+    class _Proto(asyncio.DatagramProtocol):
+        def datagram_received(self, data, addr):
+            if not reply.done():
+                reply.set_result(data)
+
+        def error_received(self, exc):
+            if not reply.done():
+                reply.set_result(None)
+
+    transport, _ = await loop.create_datagram_endpoint(_Proto, remote_addr=(ip, port))
+    try:
+        transport.sendto(payload)
+        return await asyncio.wait_for(reply, timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        transport.close()
+
+
+def _parse_ptr_answer(msg: bytes) -> str | None:
+    _, flags, qd, an, _, _ = struct.unpack("!6H", msg[:12])
+    if not flags & 0x8000:
+        return None
+    offset = 12
+    for _ in range(qd):
+        _, offset = read_name(msg, offset)
+        offset += 4
+    for _ in range(an):
+        _, offset = read_name(msg, offset)
+        rtype, _, _, rdlen = struct.unpack("!HHIH", msg[offset:offset + 10])
+        if rtype == DNS_TYPE_PTR:
+            name, _ = read_name(msg, offset + 10)
+            return name
+        offset += 10 + rdlen
+    return None
+
+
+def _netbios_query() -> bytes:
+    # NBSTAT for the wildcard name "*", first-level encoded (RFC 1002 4.1.1)
+    raw = b"*" + b"\x00" * 15
+    encoded = bytes(c for b in raw for c in (0x41 + (b >> 4), 0x41 + (b & 0x0F)))
+    header = struct.pack("!6H", random.randrange(1 << 16), 0, 1, 0, 0, 0)
+    return header + b"\x20" + encoded + b"\x00" + struct.pack("!HH", NETBIOS_TYPE_NBSTAT, 1)
+
+
+def _parse_netbios_answer(msg: bytes) -> str | None:
+    _, _, _, an, _, _ = struct.unpack("!6H", msg[:12])
+    if not an:
+        return None
+    _, offset = read_name(msg, 12)
+    rtype, _, _, _ = struct.unpack("!HHIH", msg[offset:offset + 10])
+    if rtype != NETBIOS_TYPE_NBSTAT:
+        return None
+    offset += 10
+    count = msg[offset]
+    offset += 1
+    for _ in range(count):
+        entry = msg[offset:offset + 18]
+        offset += 18
+        name, suffix = entry[:15], entry[15]
+        (flags,) = struct.unpack("!H", entry[16:18])
+        if suffix == 0x00 and not flags & 0x8000:  # unique workstation name
+            return name.decode("ascii", "replace").strip()
+    return None
+
+
+class SystemResolver:
+    """Queries the network: system resolver for PTR, direct UDP for mDNS/NetBIOS."""
+
+    def __init__(self, timeout: float = QUERY_TIMEOUT):
+        self.timeout = timeout
+
+    async def ptr(self, ip: str) -> str | None:
+        loop = asyncio.get_running_loop()
+        try:
+            host, _ = await asyncio.wait_for(
+                loop.getnameinfo((ip, 0), socket.NI_NAMEREQD), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError):
+            return None
+        return host
+
+    async def mdns(self, ip: str) -> str | None:
+        # Unicast query straight to the host's responder (RFC 6762 §5.5)
+        query = (
+            struct.pack("!6H", random.randrange(1 << 16), 0, 1, 0, 0, 0)
+            + encode_name(_reverse_name(ip))
+            + struct.pack("!HH", DNS_TYPE_PTR, 0x8001)
+        )
+        reply = await _udp_query(ip, MDNS_PORT, query, self.timeout)
+        if not reply:
+            return None
+        try:
+            return _parse_ptr_answer(reply)
+        except (struct.error, IndexError, ValueError):
+            return None
+
+    async def netbios(self, ip: str) -> str | None:
+        reply = await _udp_query(ip, NETBIOS_PORT, _netbios_query(), self.timeout)
+        if not reply:
+            return None
+        try:
+            return _parse_netbios_answer(reply)
+        except (struct.error, IndexError, ValueError):
+            return None
+
+
+class StubResolver:
+    """Canned answers for tests; records every lookup in ``calls``."""
+
+    def __init__(
+        self,
+        ptr: dict[str, str] | None = None,
+        mdns: dict[str, str] | None = None,
+        netbios: dict[str, str] | None = None,
+    ):
+        self._answers = {"ptr": ptr or {}, "mdns": mdns or {}, "netbios": netbios or {}}
+        self.calls: list[tuple[str, str]] = []
+
+    async def _lookup(self, source: str, ip: str) -> str | None:
+        self.calls.append((source, ip))
+        return self._answers[source].get(ip)
+
+    async def ptr(self, ip: str) -> str | None:
+        return await self._lookup("ptr", ip)
+
+    async def mdns(self, ip: str) -> str | None:
+        return await self._lookup("mdns", ip)
+
+    async def netbios(self, ip: str) -> str | None:
+        return await self._lookup("netbios", ip)
+
+
+_resolver = None
+
+
+def set_resolver(resolver) -> None:
+    global _resolver
+    _resolver = resolver
+
+
+def get_resolver():
+    global _resolver
+    if _resolver is None:
+        _resolver = SystemResolver()
+    return _resolver
+
+
+async def resolve_names(
+    db,
+    hosts: list[tuple[str, str | None]],
+    concurrency: int = NAME_CONCURRENCY,
+    progress_cb: Callable | None = None,
+) -> dict[str, str | None]:
+    """Names for (ip, mac) pairs, from cache where fresh, else from the network.
+
+    ``progress_cb("names", done, total, ip)`` is called as each host finishes;
+    cache hits count as done up front.
+    """
+    from sqlalchemy.dialects.sqlite import insert
+
+    from ..db.models import NameCacheEntry
+
+    if not hosts:
+        return {}
+    resolver = get_resolver()
+    now = datetime.utcnow()
+    ips = [ip for ip, _ in hosts]
+    cached = {
+        e.ip: e for e in db.query(NameCacheEntry).filter(NameCacheEntry.ip.in_(ips)).all()
+    }
+
+    names: dict[str, str | None] = {}
+    todo: list[tuple[str, str | None]] = []
+    for ip, mac in hosts:
+        entry = cached.get(ip)
+        if entry and entry.expires_at > now and (not mac or entry.mac in (None, mac)):
+            names[ip] = entry.name
+        else:
+            todo.append((ip, mac))
+    if not todo:
+        return names
+
+    sem = asyncio.Semaphore(concurrency)
+    done = len(hosts) - len(todo)
+
+    async def one(ip: str) -> tuple[str | None, str | None]:
+        nonlocal done
+        async with sem:
+            answers = await asyncio.gather(
+                *(getattr(resolver, s)(ip) for s in SOURCES), return_exceptions=True
+            )
+        done += 1
+        if progress_cb:
+            progress_cb("names", done, len(hosts), ip)
+        for source, answer in zip(SOURCES, answers):
+            name = _clean(answer) if isinstance(answer, str) else None
+            if name:
+                return source, name
+        return None, None
+
+    results = await asyncio.gather(*(one(ip) for ip, _ in todo))
+
+    rows = []
+    for (ip, mac), (source, name) in zip(todo, results):
+        names[ip] = name
+        rows.append({
+            "ip": ip,
+            "mac": mac,
+            "name": name,
+            "source": source,
+            "resolved_at": now,
+            "expires_at": now + (POSITIVE_TTL if name else NEGATIVE_TTL),
+        })
+    stmt = insert(NameCacheEntry)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["ip"],
+            set_={k: stmt.excluded[k] for k in ("mac", "name", "source", "resolved_at", "expires_at")},
+        ),
+        rows,
+    )
+    db.commit()
+    return names
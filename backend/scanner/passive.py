@@ -0,0 +1,433 @@
+"""Passive host discovery from ARP, DHCP and mDNS traffic.
+
+Listens on a raw AF_PACKET socket (Linux, needs the same privileges as nmap)
+and turns frames into sightings that are written to the database in batches.
+Frames can also be replayed from a pcap file for offline testing:
+
+    python -m backend.scanner.passive capture.pcap [--apply]
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+import struct
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from .dns import read_name
+
+logger = logging.getLogger(__name__)
+
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_VLAN = 0x8100
+
+DHCP_SERVER_PORT = 67
+DHCP_CLIENT_PORT = 68
+MDNS_PORT = 5353
+DHCP_MAGIC = b"\x63\x82\x53\x63"
+
+SO_ATTACH_FILTER = 26  # linux/filter.h; not exported by the socket module
+
+# Classic BPF: accept ARP, or unfragmented IPv4 UDP to/from ports 67, 68 or
+# 5353 (what parse_frame understands); the kernel drops everything else
+# before it reaches Python. Entries are (code, jt, jf, k).
+_BPF_PROGRAM = (
+    (0x28, 0, 0, 12),                   # 0  ldh [12]            ethertype
+    (0x15, 15, 0, ETH_P_ARP),           # 1  jeq ARP → accept
+    (0x15, 0, 13, ETH_P_IP),            # 2  jne IPv4 → drop
+    (0x30, 0, 0, 23),                   # 3  ldb [23]            IP protocol
+    (0x15, 0, 11, socket.IPPROTO_UDP),  # 4  jne UDP → drop
+    (0x28, 0, 0, 20),                   # 5  ldh [20]            flags/fragment
+    (0x45, 9, 0, 0x1FFF),               # 6  jset fragment offset → drop
+    (0xB1, 0, 0, 14),                   # 7  ldxb 4*([14]&0xf)   IP header length
+    (0x48, 0, 0, 14),                   # 8  ldh [x+14]          source port
+    (0x15, 7, 0, DHCP_SERVER_PORT),     # 9
+    (0x15, 6, 0, DHCP_CLIENT_PORT),     # 10
+    (0x15, 5, 0, MDNS_PORT),            # 11
+    (0x48, 0, 0, 16),                   # 12 ldh [x+16]          destination port
+    (0x15, 3, 0, DHCP_SERVER_PORT),     # 13
+    (0x15, 2, 0, DHCP_CLIENT_PORT),     # 14
+    (0x15, 1, 0, MDNS_PORT),            # 15
+    (0x06, 0, 0, 0),                    # 16 drop
+    (0x06, 0, 0, 0x40000),              # 17 accept
+)
+
+
+def _attach_filter(sock: socket.socket) -> None:
+    import ctypes
+
+    code = b"".join(struct.pack("HBBI", *ins) for ins in _BPF_PROGRAM)
+    buf = ctypes.create_string_buffer(code, len(code))
+    prog = struct.pack("HL", len(_BPF_PROGRAM), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, prog)
+
+
+@dataclass
+class Sighting:
+    ip: str | None  # None: host seen, address unknown; matched on MAC only
+    mac: str
+    hostname: str | None = None
+    source: str = "arp"  # arp | dhcp | mdns
+
+
+def _mac(raw: bytes) -> str:
+    return ":".join(f"{b:02X}" for b in raw)
+
+
+def _is_unicast(raw: bytes) -> bool:
+    return len(raw) == 6 and not raw[0] & 0x01 and raw != b"\x00" * 6
+
+
+def _ip(raw: bytes) -> str | None:
+    ip = socket.inet_ntoa(raw)
+    return None if ip == "0.0.0.0" else ip
+
+
+# ── Frame parsing ─────────────────────────────────────────────────────────────
+
+def parse_frame(frame: bytes) -> list[Sighting]:
+    """Extract host sightings from a single Ethernet frame."""
+    if len(frame) < 14:
+        return []
+    src_mac = frame[6:12]
+    (ethertype,) = struct.unpack("!H", frame[12:14])
+    offset = 14
+    if ethertype == ETH_P_VLAN and len(frame) >= 18:
+        (ethertype,) = struct.unpack("!H", frame[16:18])
+        offset = 18
+
+    try:
+        if ethertype == ETH_P_ARP:
+            return _parse_arp(frame[offset:])
+        if ethertype == ETH_P_IP:
+            return _parse_ipv4(frame[offset:], src_mac)
+    except (struct.error, IndexError, ValueError, OSError):
+        pass
+    return []
+
+
+def _parse_arp(pkt: bytes) -> list[Sighting]:
+    htype, ptype, hlen, plen = struct.unpack("!HHBB", pkt[:6])
+    if htype != 1 or ptype != ETH_P_IP or hlen != 6 or plen != 4:
+        return []
+    sha, spa = pkt[8:14], pkt[14:18]
+    ip = _ip(spa)
+    if not ip or not _is_unicast(sha):
+        return []  # ARP probes use 0.0.0.0 as the sender
+    return [Sighting(ip=ip, mac=_mac(sha), source="arp")]
+
+
+def _parse_ipv4(pkt: bytes, src_mac: bytes) -> list[Sighting]:
+    ihl = (pkt[0] & 0x0F) * 4
+    if pkt[9] != socket.IPPROTO_UDP:
+        return []
+    src_ip = _ip(pkt[12:16])
+    udp = pkt[ihl:]
+    sport, dport = struct.unpack("!HH", udp[:4])
+    payload = udp[8:]
+
+    if {sport, dport} == {DHCP_SERVER_PORT, DHCP_CLIENT_PORT}:
+        return _parse_dhcp(payload)
+    if sport == MDNS_PORT and src_ip and _is_unicast(src_mac):
+        return _parse_mdns(payload, src_ip, _mac(src_mac))
+    return []
+
+
+def _parse_dhcp(bootp: bytes) -> list[Sighting]:
+    if len(bootp) < 240 or bootp[236:240] != DHCP_MAGIC:
+        return []
+    op = bootp[0]
+    chaddr = bootp[28:34]
+    if not _is_unicast(chaddr):
+        return []
+
+    options: dict[int, bytes] = {}
+    i = 240
+    while i < len(bootp):
+        code = bootp[i]
+        if code == 255:
+            break
+        if code == 0:
+            i += 1
+            continue
+        length = bootp[i + 1]
+        options[code] = bootp[i + 2:i + 2 + length]
+        i += 2 + length
+
+    msg_type = options.get(53, b"\x00")[0]
+    hostname = options.get(12, b"").decode("utf-8", "replace").strip("\x00 ") or None
+    if op == 1:
+        # Client message: the requested address may be NAKed or belong to an
+        # old lease, so only vouch for the MAC (existing devices are updated)
+        ip = None
+    elif msg_type == 5:
+        ip = _ip(bootp[16:20])  # ACK: address assigned to the client
+    else:
+        return []
+    return [Sighting(ip=ip, mac=_mac(chaddr), hostname=hostname, source="dhcp")]
+
+
+def _parse_mdns(msg: bytes, src_ip: str, src_mac: str) -> list[Sighting]:
+    _, flags, qd, an, ns, ar = struct.unpack("!6H", msg[:12])
+    if not flags & 0x8000:
+        return []  # only responses announce names
+    offset = 12
+    for _ in range(qd):
+        _, offset = read_name(msg, offset)
+        offset += 4
+
+    hostname = None
+    for _ in range(an + ns + ar):
+        name, offset = read_name(msg, offset)
+        rtype, _, _, rdlen = struct.unpack("!HHIH", msg[offset:offset + 10])
+        rdata = msg[offset + 10:offset + 10 + rdlen]
+        offset += 10 + rdlen
+        if rtype == 1 and rdlen == 4 and socket.inet_ntoa(rdata) == src_ip:
+            hostname = name
+            break
+    return [Sighting(ip=src_ip, mac=src_mac, hostname=hostname, source="mdns")]
+
+
+# ── pcap replay ───────────────────────────────────────────────────────────────
+
+def read_pcap(path: str) -> Iterator[bytes]:
+    """Yield raw Ethernet frames from a classic libpcap file."""
+    with open(path, "rb") as f:
+        header = f.read(24)
+        if len(header) < 24:
+            return
+        magic = header[:4]
+        if magic in (b"\xd4\xc3\xb2\xa1", b"\x4d\x3c\xb2\xa1"):
+            endian = "<"
+        elif magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+            endian = ">"
+        else:
+            raise ValueError(f"{path}: not a pcap file (pcapng is not supported)")
+        (linktype,) = struct.unpack(endian + "I", header[20:24])
+        if linktype != 1:
+            raise ValueError(f"{path}: unsupported link type {linktype}")
+
+        while True:
+            rec = f.read(16)
+            if len(rec) < 16:
+                return
+            _, _, incl_len, _ = struct.unpack(endian + "IIII", rec)
+            frame = f.read(incl_len)
+            if len(frame) < incl_len:
+                return
+            yield frame
+
+
+def replay_pcap(path: str) -> list[Sighting]:
+    sightings: list[Sighting] = []
+    for frame in read_pcap(path):
+        sightings.extend(parse_frame(frame))
+    return sightings
+
+
+# ── Database writes ───────────────────────────────────────────────────────────
+
+def apply_sightings(db, sightings: list[Sighting]) -> int:
+    """Mark sighted devices online in one transaction; returns devices touched.
+
+    Only sightings with an address (ARP, DHCP ACK, mDNS) create devices.
+    """
+    from ..db.models import Device
+    from ..db.search import index_device
+
+    by_ip: dict[str, Sighting] = {}
+    by_mac: dict[str, Sighting] = {}
+    for s in sightings:
+        if s.ip:
+            prev = by_ip.get(s.ip)
+            if prev and prev.hostname and not s.hostname:
+                s.hostname = prev.hostname
+            by_ip[s.ip] = s
+        else:
+            by_mac[s.mac] = s
+    if not by_ip and not by_mac:
+        return 0
+
+    now = datetime.utcnow()
+    devices = db.query(Device).filter(Device.ip.in_(list(by_ip))).all() if by_ip else []
+    if by_mac:
+        devices += db.query(Device).filter(Device.mac.in_(list(by_mac))).all()
+
+    touched: dict[int, Device] = {}
+    reindex: list[Device] = []
+    created = 0
+    known_ips: set[str] = set()
+    for device in devices:
+        s = by_ip.get(device.ip) or by_mac.get(device.mac)
+        if s is None or device.id in touched:
+            continue
+        known_ips.add(device.ip)
+        device.mac = device.mac or s.mac
+        if s.hostname and not device.hostname:
+            device.hostname = s.hostname
+            reindex.append(device)
+        device.is_online = True
+        device.last_seen = now
+        touched[device.id] = device
+
+    for ip, s in by_ip.items():
+        if ip in known_ips:
+            continue
+        device = Device(
+            ip=ip,
+            mac=s.mac,
+            hostname=s.hostname,
+            is_online=True,
+            first_seen=now,
+            last_seen=now,
+        )
+        db.add(device)
+        reindex.append(device)
+        created += 1
+
+    db.flush()
+    for device in reindex:
+        index_device(db, device)
+    db.commit()
+    return len(touched) + created
+
+
+# ── Live listener ─────────────────────────────────────────────────────────────
+
+class PassiveListener:
+    """Sniffs traffic on a background thread and flushes sightings in batches."""
+
+    def __init__(
+        self,
+        iface: str | None = None,
+        flush_interval: float = 5.0,
+        batch_size: int = 200,
+    ):
+        self.iface = iface
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.last_sighting_at: datetime | None = None
+        self._queue: asyncio.Queue[Sighting] = asyncio.Queue()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._flush_task: asyncio.Task | None = None
+
+    def is_fresh(self, max_age: timedelta) -> bool:
+        """True if the listener has seen traffic within ``max_age``."""
+        if self.last_sighting_at is None:
+            return False
+        return datetime.utcnow() - self.last_sighting_at <= max_age
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            _attach_filter(sock)
+            if self.iface:
+                sock.bind((self.iface, 0))
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(1.0)
+        self._thread = threading.Thread(
+            target=self._sniff, args=(sock, loop), name="passive-discovery", daemon=True
+        )
+        self._thread.start()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._flush_task:
+            self._flush_task.cancel()
+        if self._thread:
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join, 2.0)
+
+    def _sniff(self, sock: socket.socket, loop: asyncio.AbstractEventLoop) -> None:
+        with sock:
+            while not self._stop.is_set():
+                try:
+                    frame = sock.recv(65535)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                for s in parse_frame(frame):
+                    loop.call_soon_threadsafe(self._queue.put_nowait, s)
+
+    async def _flush_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Commits can wait on the SQLite lock; keep them off the event loop
+            await loop.run_in_executor(None, self._flush, batch)
+
+    def _flush(self, batch: list[Sighting]) -> None:
+        from ..db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            apply_sightings(db, batch)
+            self.last_sighting_at = datetime.utcnow()
+        except Exception:
+            db.rollback()
+            logger.warning("dropped %d passive sightings", len(batch), exc_info=True)
+        finally:
+            db.close()
+
+
+_listener: PassiveListener | None = None
+
+
+def get_listener() -> PassiveListener | None:
+    return _listener
+
+
+async def start_listener(iface: str | None = None) -> PassiveListener:
+    global _listener
+    listener = PassiveListener(iface=iface)
+    await listener.start()
+    _listener = listener
+    return _listener
+
+
+async def stop_listener() -> None:
+    global _listener
+    if _listener:
+        await _listener.stop()
+        _listener = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a pcap through passive discovery.")
+    parser.add_argument("pcap")
+    parser.add_argument("--apply", action="store_true", help="write sightings to the database")
+    args = parser.parse_args()
+
+    found = replay_pcap(args.pcap)
+    for s in found:
+        print(f"{s.source:5} {s.ip or '-':15} {s.mac} {s.hostname or ''}")
+    if args.apply:
+        from ..db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            print(f"{apply_sightings(db, found)} devices updated")
+        finally:
+            db.close()
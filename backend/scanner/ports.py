@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import asyncio
+from concurrent.futures import Executor
 from dataclasses import dataclass, field
 from typing import Callable
 
@@ -22,64 +23,108 @@ class ScanResult:
     ip: str
     os: str | None
     ports: list[PortInfo] = field(default_factory=list)
+    # Port ranges nmap actually probed, per protocol; empty if the host wasn't scanned
+    scanned: dict[str, list[tuple[int, int]]] = field(default_factory=dict)
+
+    def covers(self, port: int, protocol: str) -> bool:
+        return any(lo <= port <= hi for lo, hi in self.scanned.get(protocol, ()))
+
+
+# Deep scan: full TCP range plus UDP services common on home networks
+TCP_FULL_RANGE = "1-65535"
+UDP_DEEP_PORTS = (
+    "53,67-69,123,137-138,161-162,500,514,520,623,1194,1900,3478,4500,"
+    "5060,5353,5683,10001,47808"
+)  # DNS, DHCP, TFTP, NTP, NetBIOS, SNMP, IKE, syslog, RIP, IPMI, OpenVPN,
+#    SSDP/UPnP, STUN, SIP, mDNS, CoAP, Ubiquiti discovery, BACnet
+DEEP_WORKERS = 8  # concurrent nmap processes across all hosts
+DEEP_SHARDS_PER_HOST = 4  # TCP range is split into this many nmap runs
+DEFAULT_PPS_BUDGET = 1000  # packets/second shared by all deep-scan workers
+
+
+def deep_workers(pps_budget: int) -> int:
+    """Concurrent nmap processes for a budget, so each gets at least 1 pps."""
+    return max(1, min(DEEP_WORKERS, pps_budget))
+
+
+def _parse_port_spec(spec: str) -> list[tuple[int, int]]:
+    """'22,80-90' → [(22, 22), (80, 90)]"""
+    ranges: list[tuple[int, int]] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        ranges.append((int(lo), int(hi or lo)))
+    return ranges
+
+
+def _format_ranges(ranges: list[tuple[int, int]]) -> str:
+    return ",".join(str(lo) if lo == hi else f"{lo}-{hi}" for lo, hi in ranges)
+
+
+def _shard_ranges(ranges: list[tuple[int, int]], shards: int) -> list[list[tuple[int, int]]]:
+    """Split port ranges into up to ``shards`` groups with roughly equal port counts."""
+    total = sum(hi - lo + 1 for lo, hi in ranges)
+    size = -(-total // max(1, shards))
+    out: list[list[tuple[int, int]]] = [[]]
+    room = size
+    for lo, hi in ranges:
+        while lo <= hi:
+            if room == 0:
+                out.append([])
+                room = size
+            take = min(room, hi - lo + 1)
+            out[-1].append((lo, lo + take - 1))
+            lo += take
+            room -= take
+    return [s for s in out if s]
 
 
 def _infer_icon(vendor: str | None, hostname: str | None, ports: list[PortInfo]) -> str:
-    """Heuristic icon type from vendor name, hostname, and open ports."""
-    vendor_l = (vendor or "").lower()
-    hostname_l = (hostname or "").lower()
-    open_ports = {p.port for p in ports if p.state == "open"}
-
-    # Router / gateway heuristics
-    if any(k in vendor_l for k in ("cisco", "netgear", "ubiquiti", "asus", "tp-link", "linksys", "zyxel", "dlink", "d-link")):
-        return "router"
-    if any(k in hostname_l for k in ("router", "gateway", "gw", "fw", "firewall")):
-        return "router"
-    if {80, 443, 8080} & open_ports and 22 not in open_ports:
-        if any(k in vendor_l for k in ("router", "modem")):
-            return "router"
-
-    # Apple devices
-    if "apple" in vendor_l:
-        if any(k in hostname_l for k in ("iphone", "ipad")):
-            return "phone"
-        if any(k in hostname_l for k in ("macbook", "imac", "mac")):
-            return "laptop"
-        return "laptop"
-
-    # Phone / tablet
-    if any(k in vendor_l for k in ("samsung", "huawei", "xiaomi", "oneplus", "google", "motorola")):
-        return "phone"
-    if any(k in hostname_l for k in ("phone", "android", "iphone", "ipad", "tablet")):
-        return "phone"
-
-    # TV / media
-    if any(k in vendor_l for k in ("roku", "amazon", "nvidia", "sonos", "logitech media")):
-        return "tv"
-    if any(k in hostname_l for k in ("tv", "firetv", "appletv", "chromecast", "shield", "roku", "kodi")):
-        return "tv"
-    if 8008 in open_ports or 8009 in open_ports:  # Chromecast
-        return "tv"
-
-    # Printer
-    if any(k in vendor_l for k in ("hp", "epson", "canon", "brother", "xerox", "lexmark", "ricoh")):
-        return "printer"
-    if any(k in hostname_l for k in ("printer", "print")):
-        return "printer"
-    if 9100 in open_ports or 631 in open_ports:  # IPP / JetDirect
-        return "printer"
-
-    # Server / NAS
-    if 22 in open_ports and (80 in open_ports or 443 in open_ports):
-        return "server"
-    if any(k in hostname_l for k in ("server", "nas", "synology", "qnap", "pi", "raspberry")):
-        return "server"
-
-    # Laptop / PC
-    if any(k in vendor_l for k in ("intel", "realtek", "dell", "lenovo", "hewlett")):
-        return "laptop"
-
-    return "device"
+    """Icon type from vendor name, hostname, and open ports (see classify.py)."""
+    from .classify import get_classifier
+
+    open_ports = [p.port for p in ports if p.state == "open"]
+    return get_classifier().classify(vendor, hostname, open_ports).category
+
+
+def _nmap_scan(ip: str, arguments: str) -> ScanResult:
+    nm = nmap.PortScanner()
+    try:
+        nm.scan(hosts=ip, arguments=arguments)
+    except Exception as exc:
+        return ScanResult(ip=ip, os=None, ports=[])
+
+    if ip not in nm.all_hosts():
+        return ScanResult(ip=ip, os=None, ports=[])
+
+    host = nm[ip]
+    ports: list[PortInfo] = []
+    for proto in host.all_protocols():
+        for port_num, pdata in host[proto].items():
+            ports.append(
+                PortInfo(
+                    port=port_num,
+                    protocol=proto,
+                    service=pdata.get("name") or None,
+                    version=(pdata.get("version") or "") + " " + (pdata.get("product") or ""),
+                    state=pdata.get("state", "open"),
+                )
+            )
+
+    scanned = {
+        proto: _parse_port_spec(info["services"])
+        for proto, info in nm.scaninfo().items()
+        if isinstance(info, dict) and info.get("services")
+    }
+
+    # OS detection
+    os_name: str | None = None
+    if "osmatch" in host and host["osmatch"]:
+        os_name = host["osmatch"][0].get("name")
+
+    return ScanResult(ip=ip, os=os_name, ports=ports, scanned=scanned)
 
 
 async def scan_device(
@@ -90,37 +135,76 @@ async def scan_device(
     loop = asyncio.get_running_loop()
 
     def _scan() -> ScanResult:
-        nm = nmap.PortScanner()
-        try:
-            nm.scan(hosts=ip, arguments="-sV --top-ports 100 -O -T4 --host-timeout 60s")
-        except Exception as exc:
-            return ScanResult(ip=ip, os=None, ports=[])
-
-        if ip not in nm.all_hosts():
-            return ScanResult(ip=ip, os=None, ports=[])
-
-        host = nm[ip]
-        ports: list[PortInfo] = []
-        for proto in host.all_protocols():
-            for port_num, pdata in host[proto].items():
-                ports.append(
-                    PortInfo(
-                        port=port_num,
-                        protocol=proto,
-                        service=pdata.get("name") or None,
-                        version=(pdata.get("version") or "") + " " + (pdata.get("product") or ""),
-                        state=pdata.get("state", "open"),
-                    )
-                )
-
-        # OS detection
-        os_name: str | None = None
-        if "osmatch" in host and host["osmatch"]:
-            os_name = host["osmatch"][0].get("name")
-
+        result = _nmap_scan(ip, "-sV --top-ports 100 -O -T4 --host-timeout 60s")
         if progress_cb:
             progress_cb("portscan", 1, 1, ip)
-
-        return ScanResult(ip=ip, os=os_name, ports=ports)
+        return result
 
     return await loop.run_in_executor(None, _scan)
+
+
+async def deep_scan_device(
+    ip: str,
+    udp: bool = True,
+    pps_budget: int = DEFAULT_PPS_BUDGET,
+    limiter: asyncio.Semaphore | None = None,
+    executor: Executor | None = None,
+) -> ScanResult:
+    """Scan all TCP ports (and UDP_DEEP_PORTS) as parallel nmap shards.
+
+    ``limiter`` caps concurrent nmap processes; share one across hosts so the
+    whole deep scan stays within ``pps_budget`` packets per second. Shards
+    block a thread for as long as nmap runs, so pass an ``executor`` sized to
+    the limiter rather than tying up the event loop's default pool.
+    """
+    loop = asyncio.get_running_loop()
+    pps_budget = max(1, pps_budget)
+    workers = deep_workers(pps_budget)
+    limiter = limiter or asyncio.Semaphore(workers)
+    rate = pps_budget // workers
+
+    jobs = [
+        f"-sS -p {_format_ranges(shard)}"
+        for shard in _shard_ranges(_parse_port_spec(TCP_FULL_RANGE), DEEP_SHARDS_PER_HOST)
+    ]
+    if udp:
+        jobs.append(f"-sU -p {UDP_DEEP_PORTS}")
+
+    async def run(scan_args: str) -> ScanResult:
+        arguments = f"{scan_args} -sV --version-light --max-rate {rate} -T4 --host-timeout 30m"
+        async with limiter:
+            fut = loop.run_in_executor(executor, _nmap_scan, ip, arguments)
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                # nmap can't be interrupted; keep the slot (and the caller) until it exits
+                while not fut.done():
+                    try:
+                        await asyncio.wait([fut])
+                    except asyncio.CancelledError:
+                        pass
+                raise
+
+    tasks = [asyncio.ensure_future(run(j)) for j in jobs]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # gather() returns on the first failure; wait until every shard has stopped
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+        raise
+
+    merged: dict[tuple[int, str], PortInfo] = {}
+    scanned: dict[str, list[tuple[int, int]]] = {}
+    for r in results:
+        for p in r.ports:
+            merged.setdefault((p.port, p.protocol), p)
+        for proto, ranges in r.scanned.items():
+            scanned.setdefault(proto, []).extend(ranges)
+    return ScanResult(
+        ip=ip,
+        os=next((r.os for r in results if r.os), None),
+        ports=sorted(merged.values(), key=lambda p: (p.protocol, p.port)),
+        scanned=scanned,
+    )
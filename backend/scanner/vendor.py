@@ -1,26 +1,54 @@
-"""MAC address → vendor name lookup using local OUI database."""
+"""MAC address → vendor name lookup using local OUI database.
+
+The OUI list is tens of thousands of entries (and is downloaded on first use
+if no cache exists), so it is loaded on demand or warmed in the background by
+``preload()`` once the app is serving requests.
+"""
 from __future__ import annotations
 
 import asyncio
-from mac_vendor_lookup import MacLookup, InvalidMacError
 
-_lookup = MacLookup().async_lookup
+_lookup = None
+_load_task: asyncio.Future | None = None
 _loaded = False
 
 
+def _get_lookup():
+    global _lookup
+    if _lookup is None:
+        from mac_vendor_lookup import AsyncMacLookup
+        _lookup = AsyncMacLookup()
+    return _lookup
+
+
 async def _ensure_loaded() -> None:
-    global _loaded
+    global _loaded, _load_task
     if _loaded:
         return
-    await _lookup.load_vendors()
+    # Share one load between the background warm-up and the first scan
+    if _load_task is None:
+        _load_task = asyncio.ensure_future(_get_lookup().load_vendors())
+    try:
+        await asyncio.shield(_load_task)
+    except Exception:
+        _load_task = None
+        raise
     _loaded = True
 
 
+async def preload() -> None:
+    """Load the OUI database ahead of the first scan; errors surface on lookup."""
+    try:
+        await _ensure_loaded()
+    except Exception:
+        pass
+
+
 async def get_vendor(mac: str | None) -> str | None:
     if not mac:
         return None
     await _ensure_loaded()
     try:
-        return await _lookup.lookup(mac)
-    except (InvalidMacError, KeyError, Exception):
+        return await _get_lookup().lookup(mac)
+    except Exception:
         return None
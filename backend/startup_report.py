@@ -0,0 +1,122 @@
+"""Startup cost report: import times and cold start to first /api/devices.
+
+    python -m backend.startup_report [--top 15]
+
+Exits non-zero if the cold start exceeds TARGET_COLD_START_S.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+TARGET_COLD_START_S = 2.0
+
+
+def import_report(module: str = "backend.main") -> list[tuple[int, int, str]]:
+    """Return (self_us, cumulative_us, name) for every import made by ``module``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    rows: list[tuple[int, int, str]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cum_us), name.rstrip()))
+    return rows
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _copy_db(src: str, dst: str) -> None:
+    # Backup API gives a consistent copy even while the real server is writing
+    if not os.path.exists(src):
+        return
+    source, target = sqlite3.connect(src), sqlite3.connect(dst)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def cold_start(timeout: float = 30.0) -> float:
+    """Seconds from launching uvicorn to the first successful /api/devices.
+
+    The server runs against a throwaway copy of the database (realistic
+    inventory size, but migrate() never touches the real one) and without
+    the passive listener.
+    """
+    from .db.database import DB_PATH
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/api/devices"
+    with tempfile.TemporaryDirectory(prefix="startup-report-") as tmp:
+        db_copy = os.path.join(tmp, "scanner.db")
+        _copy_db(DB_PATH, db_copy)
+        env = {**os.environ, "DB_PATH": db_copy}
+        env.pop("PASSIVE_DISCOVERY", None)
+        return _time_first_response(url, port, env, timeout)
+
+
+def _time_first_response(url: str, port: int, env: dict, timeout: float) -> float:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port),
+         "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+        raise TimeoutError(f"no response from {url} within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="imports to list")
+    args = parser.parse_args()
+
+    rows = import_report()
+    total = next((cum for _, cum, name in rows if name.strip() == "backend.main"), 0)
+    print(f"import backend.main: {total / 1000:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for self_us, cum_us, name in sorted(rows, key=lambda r: r[1], reverse=True)[1:args.top + 1]:
+        print(f"{cum_us / 1000:14.1f} {self_us / 1000:8.1f}  {name.strip()}")
+
+    heavy = [m for m in ("nmap", "mac_vendor_lookup", "apscheduler")
+             if any(name.strip() == m for _, _, name in rows)]
+    print(f"\nheavy scanner deps imported at startup: {', '.join(heavy) or 'none'}")
+
+    elapsed = cold_start()
+    verdict = "ok" if elapsed <= TARGET_COLD_START_S else "OVER TARGET"
+    print(f"cold start to first /api/devices: {elapsed:.2f} s "
+          f"(target {TARGET_COLD_START_S:.1f} s, {verdict})")
+    return 0 if elapsed <= TARGET_COLD_START_S else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
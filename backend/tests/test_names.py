@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from backend.db.models import NameCacheEntry
+from backend.scanner import names
+from backend.scanner.names import NEGATIVE_TTL, POSITIVE_TTL, StubResolver, resolve_names
+
+
+@pytest.fixture
+def resolver():
+    stub = StubResolver(ptr={"10.0.0.5": "nas.lan."}, mdns={"10.0.0.6": "printer.local"})
+    names.set_resolver(stub)
+    yield stub
+    names.set_resolver(None)
+
+
+def _resolve(db, hosts):
+    return asyncio.run(resolve_names(db, hosts))
+
+
+def _entry(db, ip: str) -> NameCacheEntry:
+    db.expire_all()
+    return db.get(NameCacheEntry, ip)
+
+
+def test_cache_hit_skips_lookups(db, resolver):
+    hosts = [("10.0.0.5", "02:00:00:00:00:05"), ("10.0.0.6", "02:00:00:00:00:06")]
+    assert _resolve(db, hosts) == {"10.0.0.5": "nas.lan", "10.0.0.6": "printer.local"}
+    assert _entry(db, "10.0.0.5").source == "ptr"
+    assert _entry(db, "10.0.0.6").source == "mdns"
+    entry = _entry(db, "10.0.0.5")
+    assert entry.expires_at - entry.resolved_at == POSITIVE_TTL
+
+    resolver.calls.clear()
+    assert _resolve(db, hosts) == {"10.0.0.5": "nas.lan", "10.0.0.6": "printer.local"}
+    assert resolver.calls == []
+
+
+def test_miss_is_cached_for_negative_ttl(db, resolver):
+    hosts = [("10.0.0.7", "02:00:00:00:00:07")]
+    assert _resolve(db, hosts) == {"10.0.0.7": None}
+    entry = _entry(db, "10.0.0.7")
+    assert entry.expires_at - entry.resolved_at == NEGATIVE_TTL
+
+    resolver.calls.clear()
+    assert _resolve(db, hosts) == {"10.0.0.7": None}
+    assert resolver.calls == []
+
+    # Once the miss expires the host is looked up again
+    entry.resolved_at -= NEGATIVE_TTL
+    entry.expires_at -= NEGATIVE_TTL
+    db.commit()
+    resolver._answers["netbios"]["10.0.0.7"] = "DESKTOP-1"
+    assert _resolve(db, hosts) == {"10.0.0.7": "DESKTOP-1"}
+    assert ("netbios", "10.0.0.7") in resolver.calls
+
+
+def test_mac_change_invalidates_entry(db, resolver):
+    assert _resolve(db, [("10.0.0.5", "02:00:00:00:00:05")]) == {"10.0.0.5": "nas.lan"}
+
+    # Same address, different device: the cached name no longer applies
+    resolver.calls.clear()
+    resolver._answers["ptr"]["10.0.0.5"] = "camera.lan"
+    assert _resolve(db, [("10.0.0.5", "02:00:00:00:00:55")]) == {"10.0.0.5": "camera.lan"}
+    assert ("ptr", "10.0.0.5") in resolver.calls
+    assert _entry(db, "10.0.0.5").mac == "02:00:00:00:00:55"
+
+    # Hosts with no known MAC still use the cache
+    resolver.calls.clear()
+    assert _resolve(db, [("10.0.0.5", None)]) == {"10.0.0.5": "camera.lan"}
+    assert resolver.calls == []
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from backend.scanner.passive import Sighting, parse_frame, read_pcap, replay_pcap
+
+# ARP reply, ARP probe, DHCP ACK, DHCP REQUEST, mDNS response, TCP segment
+PCAP = Path(__file__).parent / "fixtures" / "discovery.pcap"
+
+
+def test_replay_pcap_extracts_sightings():
+    assert replay_pcap(str(PCAP)) == [
+        Sighting(ip="10.0.0.5", mac="02:00:00:00:00:05", source="arp"),
+        Sighting(ip="10.0.0.7", mac="02:00:00:00:00:07", hostname="laptop", source="dhcp"),
+        Sighting(ip=None, mac="02:00:00:00:00:08", hostname="phone", source="dhcp"),
+        Sighting(ip="10.0.0.9", mac="02:00:00:00:00:09", hostname="printer.local", source="mdns"),
+    ]
+
+
+def test_parse_frame_ignores_probes_and_other_traffic():
+    frames = list(read_pcap(str(PCAP)))
+    assert len(frames) == 6
+    assert parse_frame(frames[1]) == []  # ARP probe from 0.0.0.0
+    assert parse_frame(frames[5]) == []  # TCP
+
+
+def test_parse_frame_survives_truncated_frames():
+    for frame in read_pcap(str(PCAP)):
+        for cut in range(len(frame)):
+            parse_frame(frame[:cut])
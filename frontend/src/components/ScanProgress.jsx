@@ -1,7 +1,9 @@
 const PHASE_LABELS = {
   discover: 'Discovering hosts',
+  names: 'Resolving names',
   vendor: 'Looking up vendors',
   portscan: 'Scanning ports',
+  deepscan: 'Deep scanning ports',
   done: 'Scan complete',
 }
 
@@ -14,11 +14,14 @@ async function request(path, options = {}) {
 
 export const api = {
   getDevices: () => request('/devices'),
+  searchDevices: (params) => request(`/devices/search?${new URLSearchParams(params)}`),
   getDevice: (id) => request(`/devices/${id}`),
   patchDevice: (id, data) =>
     request(`/devices/${id}`, { method: 'PATCH', body: JSON.stringify(data) }),
   getDeviceHistory: (id) => request(`/devices/${id}/history`),
+  getDevicePorts: (id) => request(`/devices/${id}/ports`),
   startScan: () => request('/scan', { method: 'POST' }),
+  startDeepScan: (data = {}) => request('/scan/deep', { method: 'POST', body: JSON.stringify(data) }),
   getScanStatus: () => request('/scan/status'),
   getSchedule: () => request('/schedule'),
   putSchedule: (data) => request('/schedule', { method: 'PUT', body: JSON.stringify(data) }),